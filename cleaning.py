@@ -5,12 +5,25 @@ Created on Mon Jul 25 14:
 
 Cite: https://www.geeksforgeeks.org/handling-large-datasets-in-python/
 """
+import numpy as np
 import pandas as pd
 from dateutil.parser import parse
 from pandas import Series
 
 from tqdm import tqdm
 
+from engines import get_engine
+from precision import get_float_dtype
+
+# Entities tracked in every frame, 11 players on each team and the football
+EXPECTED_ENTITIES = 23
+
+# Columns that identify a single tracking row
+TRACKING_KEYS = ['gameId', 'playId', 'nflId', 'frameId']
+
+# Events that mark the end of a play in the tracking data
+PLAY_END_EVENTS = ['tackle', 'touchdown', 'out_of_bounds']
+
 
 # Combine all datasets into one master
 def load_all_data(games: pd.DataFrame, plays: pd.DataFrame, tracking: pd.DataFrame,
@@ -97,6 +110,10 @@ def clean_plays_data(plays: pd.DataFrame) -> pd.DataFrame:
     :param plays: Raw plays dataset
     :return: Cleaned plays dataset
     """
+    if get_engine() == 'polars':
+        import polars_engine
+        return polars_engine.clean_plays_data(plays)
+
     # There will be yardline side NAs for when the line of scrimmage is exactly on the 50 yard line
     # There are a few hundred plays where its registered as a pass but the passLength is NA, this is because
     # the play was designed to be a pass, but the quarterback scrambled and did not throw the ball
@@ -121,12 +138,13 @@ def clean_plays_data(plays: pd.DataFrame) -> pd.DataFrame:
     # Convert the specified columns to int32
     plays[plays_columns_to_convert_to_int] = plays[plays_columns_to_convert_to_int].astype('int32')
 
-    # This constrains the floats to 7 digits which might affect the outcome and can be changed back to float64
+    # In the default float32 precision this constrains the floats to 7 digits which might affect the outcome,
+    # use precision.set_precision('float64') to keep them exact
     plays_columns_to_convert_to_float = ['passLength', 'penaltyYards', 'defendersInTheBox', 'passProbability',
                                          'preSnapHomeTeamWinProbability', 'preSnapVisitorTeamWinProbability',
                                          'homeTeamWinProbabilityAdded', 'visitorTeamWinProbilityAdded',
                                          'expectedPoints', 'expectedPointsAdded']
-    plays[plays_columns_to_convert_to_float] = plays[plays_columns_to_convert_to_float].astype('float32')
+    plays[plays_columns_to_convert_to_float] = plays[plays_columns_to_convert_to_float].astype(get_float_dtype())
 
     # AFTER CLEANING NA VALUES
     # yardlineSide 163
@@ -227,6 +245,10 @@ def clean_tracking_data(tracking: pd.DataFrame) -> pd.DataFrame:
     :param tracking: Raw tracking data
     :return: Cleaned tracking data
     """
+    if get_engine() == 'polars':
+        import polars_engine
+        return polars_engine.clean_tracking_data(tracking)
+
     # Keep track of memory in kilobytes
     memory_before = tracking.memory_usage().sum() / 1024
 
@@ -234,9 +256,10 @@ def clean_tracking_data(tracking: pd.DataFrame) -> pd.DataFrame:
     tracking_columns_to_convert_to_int = ['gameId', 'playId', 'frameId']
     tracking[tracking_columns_to_convert_to_int] = tracking[tracking_columns_to_convert_to_int].astype('int32')
 
-    # Columns to transform to float
+    # Columns to transform to float, in the precision of the pipeline
     tracking_columns_to_convert_to_float = ['x', 'y', 'a', 's', 'o', 'dir', 'dis']
-    tracking[tracking_columns_to_convert_to_float] = tracking[tracking_columns_to_convert_to_float].astype('float32')
+    tracking[tracking_columns_to_convert_to_float] = tracking[tracking_columns_to_convert_to_float].astype(
+        get_float_dtype())
 
     # Make the time of the frame into a pandas datetime
     # Keep as both the date and time since the tracking data gives both the date and the time
@@ -255,6 +278,10 @@ def clean_tackles_data(tackles: pd.DataFrame) -> pd.DataFrame:
     :param tackles: Raw tackles dataset
     :return: Cleaned tackles dataset
     """
+    if get_engine() == 'polars':
+        import polars_engine
+        return polars_engine.clean_tackles_data(tackles)
+
     # Keep track of memory in kilobytes
     memory_before = tackles.memory_usage().sum() / 1024
 
@@ -278,6 +305,10 @@ def check_for_snap(plays: pd.DataFrame, tracking: pd.DataFrame) -> pd.DataFrame:
     :param tracking: Dataframe containing tracking data
     :return: Plays dataframe containing only plays that tracking starts before the snap of the ball
     """
+    if get_engine() == 'polars':
+        import polars_engine
+        return polars_engine.check_for_snap(plays, tracking)
+
     # Keep a list of the indices of invalid plays to then drop later
     invalid_plays = []
 
@@ -290,11 +321,12 @@ def check_for_snap(plays: pd.DataFrame, tracking: pd.DataFrame) -> pd.DataFrame:
             play_index = plays.query('gameId == @game and playId == @play').index.values[0]
             # Get the list of events that have occurred that play
             frame_events = tracking.query('gameId == @game and playId == @play')['event'].unique().tolist()
-        if 'ball_snap' not in frame_events:
-            print('gameId = ' + str(game) + ' playId = ' + str(play))
-            # If a ball snap is not registered in the play events, this means that the player tracking
-            # started after the ball was snapped. This is not a play we want to train on and therefore will be removed
-            invalid_plays.append(play_index)
+            if 'ball_snap' not in frame_events:
+                print('gameId = ' + str(game) + ' playId = ' + str(play))
+                # If a ball snap is not registered in the play events, this means that the player tracking
+                # started after the ball was snapped. This is not a play we want to train on and therefore will be
+                # removed
+                invalid_plays.append(play_index)
     final_plays = plays.drop(index=invalid_plays)
     print("Removed " + str(len(invalid_plays)) + " plays that do not have tracking at the snap of the ball.")
     return final_plays
@@ -308,6 +340,10 @@ def check_for_end(plays: pd.DataFrame, tracking: pd.DataFrame) -> pd.DataFrame:
     :param tracking: Dataframe containing tracking data
     :return: Plays dataframe containing only plays that tracking ends after the play ends
     """
+    if get_engine() == 'polars':
+        import polars_engine
+        return polars_engine.check_for_end(plays, tracking)
+
     # Keep a list of the indices of invalid plays to then drop later
     invalid_plays = []
 
@@ -320,11 +356,11 @@ def check_for_end(plays: pd.DataFrame, tracking: pd.DataFrame) -> pd.DataFrame:
             play_index = plays.query('gameId == @game and playId == @play').index.values[0]
             # Get the list of events that have occurred that play
             frame_events = tracking.query('gameId == @game and playId == @play')['event'].unique().tolist()
-        if 'tackle' not in frame_events or 'touchdown' not in frame_events or 'out_of_bounds' not in frame_events:
-            # If a tackle, touchdown, or out_of_bounds is not registered in the play events, this means that the
-            # player tracking ended before the play ended. This is not a play we want to train on and therefore
-            # will be removed
-            invalid_plays.append(play_index)
+            if not set(PLAY_END_EVENTS).intersection(frame_events):
+                # If none of a tackle, touchdown, or out_of_bounds is registered in the play events, this means that
+                # the player tracking ended before the play ended. This is not a play we want to train on and
+                # therefore will be removed
+                invalid_plays.append(play_index)
     final_plays = plays.drop(index=invalid_plays)
     print("Removed " + str(len(invalid_plays)) + " plays that do not have tracking for the end of the play.")
     return final_plays
@@ -337,6 +373,10 @@ def check_for_ball_carrier(plays: pd.DataFrame, tracking: pd.DataFrame) -> pd.Da
     :param tracking: Dataframe containing tracking data
     :return: Plays dataframe containing only plays that the ball carrier is in the tracking data
     """
+    if get_engine() == 'polars':
+        import polars_engine
+        return polars_engine.check_for_ball_carrier(plays, tracking)
+
     # Keep a list of the indices of invalid plays to then drop later
     invalid_plays = []
 
@@ -359,3 +399,127 @@ def check_for_ball_carrier(plays: pd.DataFrame, tracking: pd.DataFrame) -> pd.Da
     print("Removed " + str(len(invalid_plays)) + " plays that do not have the ball carrier in the frames.")
     return final_plays
 
+
+def _sorted_tracking_order(tracking: pd.DataFrame) -> np.ndarray:
+    """
+    Helper function for the order that puts every track of the tracking data together and in frame order
+    :param tracking: Dataframe containing tracking data
+    :return: Array of row positions
+    """
+    return np.lexsort((tracking['frameId'].to_numpy(), tracking['nflId'].fillna(-1).to_numpy(),
+                       tracking['playId'].to_numpy(), tracking['gameId'].to_numpy()))
+
+
+def check_tracking_integrity(tracking: pd.DataFrame, expected_entities: int = EXPECTED_ENTITIES) -> pd.DataFrame:
+    """
+    Checks every play for duplicate rows, gaps in the frames of a player, frames with the wrong number of players and
+    a playDirection that changes during the play. Everything is found in one pass over the sorted tracking data
+    instead of looping over the plays.
+    :param tracking: Dataframe containing tracking data
+    :param expected_entities: Number of players and football expected in every frame
+    :return: Dataframe indexed by (gameId, playId) with the number of duplicate rows, the number of missing frames,
+    the longest gap, the fewest and most entities in a frame, whether the entity count or the playDirection is wrong
+    and whether the play passed every check
+    """
+    order = _sorted_tracking_order(tracking)
+    game_ids, play_ids, nfl_ids, frame_ids = [tracking[column].to_numpy()[order] if column != 'nflId' else
+                                              tracking[column].fillna(-1).to_numpy()[order]
+                                              for column in TRACKING_KEYS]
+    direction_codes = pd.factorize(tracking['playDirection'])[0][order]
+
+    # Compare every row with the row before it
+    same_play = (game_ids[1:] == game_ids[:-1]) & (play_ids[1:] == play_ids[:-1])
+    same_track = same_play & (nfl_ids[1:] == nfl_ids[:-1])
+    duplicate = np.r_[False, same_track & (frame_ids[1:] == frame_ids[:-1])]
+    missing = np.r_[0, np.where(same_track, np.maximum(np.diff(frame_ids) - 1, 0), 0)]
+    direction_change = np.r_[False, same_play & (direction_codes[1:] != direction_codes[:-1])]
+
+    # Every play is a contiguous block of the sorted rows
+    play_starts = np.flatnonzero(np.r_[True, ~same_play]) if len(order) > 0 else np.array([], dtype=int)
+    flags = pd.DataFrame(index=pd.MultiIndex.from_arrays([game_ids[play_starts], play_ids[play_starts]],
+                                                         names=['gameId', 'playId']))
+    if len(play_starts) == 0:
+        return flags.assign(duplicate_rows=0, missing_frames=0, longest_gap=0, min_entities=0, max_entities=0,
+                            wrong_entity_count=False, inconsistent_play_direction=False, valid=True)
+
+    flags['duplicate_rows'] = np.add.reduceat(duplicate.astype(np.int64), play_starts)
+    flags['missing_frames'] = np.add.reduceat(missing, play_starts)
+    flags['longest_gap'] = np.maximum.reduceat(missing, play_starts)
+
+    # Entities in every frame of a play, counting duplicate rows once
+    play_codes = np.cumsum(np.r_[True, ~same_play]) - 1
+    frame_sizes = pd.Series(1, index=pd.MultiIndex.from_arrays([play_codes[~duplicate], frame_ids[~duplicate]]))
+    frame_sizes = frame_sizes.groupby(level=[0, 1]).size().groupby(level=0).agg(['min', 'max'])
+    flags['min_entities'] = frame_sizes['min'].to_numpy()
+    flags['max_entities'] = frame_sizes['max'].to_numpy()
+    flags['wrong_entity_count'] = (flags['min_entities'] != expected_entities) | \
+                                  (flags['max_entities'] != expected_entities)
+
+    flags['inconsistent_play_direction'] = np.logical_or.reduceat(direction_change, play_starts)
+    flags['valid'] = (flags['duplicate_rows'] == 0) & (flags['missing_frames'] == 0) & \
+                     ~flags['wrong_entity_count'] & ~flags['inconsistent_play_direction']
+
+    print(str((~flags['valid']).sum()) + " of " + str(len(flags)) + " plays failed the tracking integrity checks.")
+    return flags
+
+
+def repair_tracking(tracking: pd.DataFrame, max_gap: int = 3) -> pd.DataFrame:
+    """
+    Removes duplicate tracking rows and fills gaps of up to max_gap missing frames in a player's track by linear
+    interpolation between the frames on either side. Longer gaps are left for check_tracking_integrity to flag.
+    :param tracking: Dataframe containing tracking data
+    :param max_gap: Longest gap, in frames, to fill in
+    :return: Tracking data sorted by play, player and frame, with an interpolated column marking the filled in rows
+    """
+    order = _sorted_tracking_order(tracking)
+    repaired = tracking.iloc[order].drop_duplicates(TRACKING_KEYS).reset_index(drop=True)
+    repaired['interpolated'] = False
+
+    # Gaps are found between consecutive rows of the same track
+    frame_ids = repaired['frameId'].to_numpy()
+    same_track = np.ones(max(len(repaired) - 1, 0), dtype=bool)
+    for column in ['gameId', 'playId']:
+        values = repaired[column].to_numpy()
+        same_track &= values[1:] == values[:-1]
+    nfl_ids = repaired['nflId'].fillna(-1).to_numpy()
+    same_track &= nfl_ids[1:] == nfl_ids[:-1]
+    gap = np.where(same_track, np.diff(frame_ids) - 1, 0)
+    gap_rows = np.flatnonzero((gap > 0) & (gap <= max_gap))
+    if len(gap_rows) == 0:
+        print("Removed " + str(len(tracking) - len(repaired)) + " duplicate tracking rows.")
+        return repaired
+
+    # One new row per missing frame, weighted by how far it is between the rows on either side
+    gap_sizes = gap[gap_rows]
+    before = np.repeat(gap_rows, gap_sizes)
+    after = before + 1
+    step = np.arange(gap_sizes.sum()) - np.repeat(np.cumsum(gap_sizes) - gap_sizes, gap_sizes) + 1
+    weight = step / np.repeat(gap_sizes + 1, gap_sizes)
+
+    filled = repaired.iloc[before].reset_index(drop=True)
+    filled['frameId'] = (frame_ids[before] + step).astype(repaired['frameId'].dtype)
+    filled['event'] = np.nan
+    filled['interpolated'] = True
+    for column in ['x', 'y', 's', 'a', 'dis']:
+        values = repaired[column].to_numpy(dtype='float64')
+        filled[column] = (values[before] + weight * (values[after] - values[before])).astype(repaired[column].dtype)
+    for column in ['o', 'dir']:
+        # Angles are interpolated along the shortest way around the circle
+        values = repaired[column].to_numpy(dtype='float64')
+        turn = (values[after] - values[before] + 180) % 360 - 180
+        filled[column] = ((values[before] + weight * turn) % 360).astype(repaired[column].dtype)
+
+    times = pd.to_datetime(repaired['time']).to_numpy()
+    filled_times = times[before] + weight * (times[after] - times[before])
+    if pd.api.types.is_datetime64_any_dtype(repaired['time']):
+        filled['time'] = filled_times
+    else:
+        # Raw tracking keeps the time as text
+        filled['time'] = pd.DatetimeIndex(filled_times).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    repaired = pd.concat([repaired, filled], ignore_index=True)
+    repaired = repaired.iloc[_sorted_tracking_order(repaired)].reset_index(drop=True)
+
+    print("Removed " + str(len(tracking) - len(repaired) + len(filled)) + " duplicate tracking rows and interpolated " +
+          str(len(filled)) + " missing frames.")
+    return repaired
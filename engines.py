@@ -0,0 +1,46 @@
+"""
+File: engines.py
+Pipeline-wide execution engine option.
+
+'pandas' (the default) runs cleaning.py and preprocessing.py with single-threaded pandas operations. 'polars' runs the
+cleaning casts, the ball carrier, snap and play end checks, the football join and the vector features on the
+multithreaded columnar engine in polars_engine.py instead. The function signatures stay the same, and each function
+returns the same kind of table it was given (pandas DataFrame, polars DataFrame or pyarrow Table).
+"""
+from contextlib import contextmanager
+
+ENGINES = ['pandas', 'polars']
+
+_engine = 'pandas'
+
+
+def set_engine(engine: str):
+    """
+    Sets the engine used by the whole pipeline
+    :param engine: Either 'pandas' or 'polars' (requires polars and pyarrow)
+    """
+    global _engine
+    if engine not in ENGINES:
+        raise ValueError(f"Engine must be one of {ENGINES}, not {engine}.")
+    _engine = engine
+
+
+def get_engine() -> str:
+    """
+    :return: Name of the engine used by the pipeline
+    """
+    return _engine
+
+
+@contextmanager
+def use_engine(engine: str):
+    """
+    Temporarily sets the engine used by the pipeline, e.g. with use_engine('polars'): ...
+    :param engine: Either 'pandas' or 'polars'
+    """
+    previous = _engine
+    set_engine(engine)
+    try:
+        yield
+    finally:
+        set_engine(previous)
@@ -0,0 +1,224 @@
+"""
+File: heatmaps.py
+League-wide heatmaps of player positions, aggregated in constant memory.
+
+A HeatmapAccumulator holds one fixed-size 2D histogram of the field for every combination of team, position and down.
+Tracking is added to it chunk by chunk, normalized left to right the same way as all_plays_left_to_right, so the
+memory used only depends on the bin size and the number of combinations, not on the number of tracking rows.
+Accumulators built from different chunks or weeks are merged by adding their histograms, which lets
+aggregate_heatmaps build one accumulator per week in parallel and merge each one as soon as it is done.
+"""
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+FIELD_LENGTH = 120
+FIELD_WIDTH = 53.3
+
+# Size of the square bins of the histograms in yards
+DEFAULT_BIN_SIZE = 1.0
+
+# Columns each heatmap is split by
+DEFAULT_GROUPS = ('club', 'position', 'down')
+
+
+class HeatmapAccumulator:
+    """
+    Fixed-size histograms of player positions, one per group
+    """
+
+    def __init__(self, bin_size: float = DEFAULT_BIN_SIZE, by: tuple = DEFAULT_GROUPS):
+        """
+        :param bin_size: Size of the square bins in yards
+        :param by: Columns to split the heatmaps by, any of club, position, down or columns of the tracking data
+        """
+        self.bin_size = bin_size
+        self.by = tuple(by)
+        self.x_bins = int(np.ceil(FIELD_LENGTH / bin_size))
+        self.y_bins = int(np.ceil(FIELD_WIDTH / bin_size))
+        self.counts = {}
+        self.rows_added = 0
+
+    def add(self, tracking: pd.DataFrame, plays: pd.DataFrame = None, players: pd.DataFrame = None,
+            normalize: bool = True):
+        """
+        Adds the positions of a chunk of tracking data to the histograms. The football and rows without a value for
+        every group column are skipped.
+        :param tracking: DataFrame containing a chunk of the tracking data
+        :param plays: DataFrame containing the plays data, needed to split by down
+        :param players: DataFrame containing the players data, needed to split by position
+        :param normalize: Whether to turn plays going left so that every play goes from left to right
+        :return: The accumulator
+        """
+        tracking = tracking[tracking['displayName'] != 'football']
+        x = tracking['x'].to_numpy(dtype='float64')
+        y = tracking['y'].to_numpy(dtype='float64')
+
+        # Same 180-degree rotation around the middle of the field as all_plays_left_to_right
+        if normalize:
+            left = (tracking['playDirection'] == 'left').to_numpy()
+            x = np.where(left, FIELD_LENGTH - x, x)
+            y = np.where(left, 2 * 26.65 - y, y)
+
+        # Look up the down and position by index instead of merging the plays and players into the chunk
+        groups = {}
+        for column in self.by:
+            if column == 'down' and 'down' not in tracking:
+                play_keys = pd.MultiIndex.from_frame(tracking[['gameId', 'playId']])
+                downs = plays.drop_duplicates(['gameId', 'playId']).set_index(['gameId', 'playId'])['down']
+                groups[column] = downs.reindex(play_keys).to_numpy()
+            elif column == 'position' and 'position' not in tracking:
+                positions = players.drop_duplicates('nflId').set_index('nflId')['position']
+                groups[column] = positions.reindex(tracking['nflId']).to_numpy()
+            else:
+                groups[column] = tracking[column].to_numpy()
+        groups = pd.DataFrame(groups)
+
+        x_bin = np.floor(x / self.bin_size)
+        y_bin = np.floor(y / self.bin_size)
+        keep = (x_bin >= 0) & (x_bin < self.x_bins) & (y_bin >= 0) & (y_bin < self.y_bins) & \
+            groups.notnull().all(axis=1).to_numpy()
+        if not keep.any():
+            return self
+
+        groups = groups[keep]
+        cells = self.x_bins * self.y_bins
+        cell = x_bin[keep].astype(np.int64) * self.y_bins + y_bin[keep].astype(np.int64)
+        group_codes, group_keys = pd.factorize(pd.MultiIndex.from_frame(groups))
+
+        # Count every (group, cell) pair in one pass, then add the counts of each group to its histogram
+        pairs, pair_counts = np.unique(group_codes * cells + cell, return_counts=True)
+        pair_groups = pairs // cells
+        boundaries = np.flatnonzero(np.diff(pair_groups)) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(pairs)]):
+            key = tuple(group_keys[pair_groups[start]])
+            histogram = self.counts.get(key)
+            if histogram is None:
+                histogram = np.zeros((self.x_bins, self.y_bins), dtype=np.int64)
+                self.counts[key] = histogram
+            histogram.reshape(-1)[pairs[start:end] % cells] += pair_counts[start:end]
+
+        self.rows_added += int(keep.sum())
+        return self
+
+    def merge(self, other: 'HeatmapAccumulator') -> 'HeatmapAccumulator':
+        """
+        Adds the histograms of another accumulator into this one
+        :param other: Accumulator with the same bin size and groups
+        :return: The accumulator
+        """
+        if other.bin_size != self.bin_size or other.by != self.by:
+            raise ValueError("Only heatmaps with the same bin size and groups can be merged.")
+
+        for key, histogram in other.counts.items():
+            if key in self.counts:
+                self.counts[key] += histogram
+            else:
+                self.counts[key] = histogram.copy()
+        self.rows_added += other.rows_added
+        return self
+
+    def heatmap(self, *key) -> np.ndarray:
+        """
+        Gets the histogram of one group, indexed by [x bin, y bin]
+        :param key: Values of the group columns, e.g. 'LA', 'CB', 1
+        :return: 2D array of counts, all zeros if the group was never seen
+        """
+        return self.counts.get(tuple(key), np.zeros((self.x_bins, self.y_bins), dtype=np.int64))
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Lists the non-empty bins of every histogram
+        :return: DataFrame with the group columns, the x and y of the corner of each bin and the count
+        """
+        frames = []
+        for key, histogram in self.counts.items():
+            x_bin, y_bin = np.nonzero(histogram)
+            frame = pd.DataFrame({column: value for column, value in zip(self.by, key)}, index=range(len(x_bin)))
+            frame['x'] = x_bin * self.bin_size
+            frame['y'] = y_bin * self.bin_size
+            frame['count'] = histogram[x_bin, y_bin]
+            frames.append(frame)
+
+        if len(frames) == 0:
+            return pd.DataFrame(columns=list(self.by) + ['x', 'y', 'count'])
+        return pd.concat(frames, ignore_index=True)
+
+
+# The plays, players and settings are sent to each worker process once instead of with every week
+_worker_settings = {}
+
+
+def _init_worker(plays: pd.DataFrame, players: pd.DataFrame, bin_size: float, by: tuple, chunksize: int,
+                 sample: pd.DataFrame):
+    _worker_settings['plays'] = plays
+    _worker_settings['players'] = players
+    _worker_settings['bin_size'] = bin_size
+    _worker_settings['by'] = by
+    _worker_settings['chunksize'] = chunksize
+    _worker_settings['sample'] = sample
+
+
+def _accumulate_tracking_file(tracking_path: str) -> HeatmapAccumulator:
+    """
+    Helper function to build the heatmaps of one tracking CSV, reading it in chunks
+    :param tracking_path: Path to the tracking CSV
+    :return: Accumulator of the CSV
+    """
+    accumulator = HeatmapAccumulator(_worker_settings['bin_size'], _worker_settings['by'])
+    for chunk in pd.read_csv(tracking_path, chunksize=_worker_settings['chunksize']):
+        if _worker_settings['sample'] is not None:
+            import sampling
+            chunk = sampling.filter_to_sample(chunk, _worker_settings['sample'])
+        accumulator.add(chunk, _worker_settings['plays'], _worker_settings['players'])
+    return accumulator
+
+
+def aggregate_heatmaps(tracking_paths: list, plays: pd.DataFrame, players: pd.DataFrame,
+                       bin_size: float = DEFAULT_BIN_SIZE, by: tuple = DEFAULT_GROUPS, chunksize: int = 500000,
+                       workers: int = None, sample: pd.DataFrame = None) -> HeatmapAccumulator:
+    """
+    Builds the heatmaps of the whole season. Each tracking CSV is read in chunks by its own worker process and its
+    accumulator is merged as soon as it is done, so at most one accumulator per worker is kept at a time.
+    :param tracking_paths: Paths to the weekly tracking CSVs
+    :param plays: DataFrame containing the plays data
+    :param players: DataFrame containing the players data
+    :param bin_size: Size of the square bins in yards
+    :param by: Columns to split the heatmaps by
+    :param chunksize: Number of rows to read from the CSVs at a time
+    :param workers: Number of worker processes, defaults to the number of CPUs. 1 runs in this process
+    :param sample: Optional output of sampling.sample_plays, only the sampled plays are counted
+    :return: Accumulator with the heatmaps of every CSV
+    """
+    # Only the columns used for the lookups are sent to the workers
+    plays = plays[['gameId', 'playId', 'down']]
+    players = players[['nflId', 'position']]
+    settings = (plays, players, bin_size, tuple(by), chunksize, sample)
+
+    accumulator = HeatmapAccumulator(bin_size, by)
+    if workers == 1:
+        _init_worker(*settings)
+        for path in tracking_paths:
+            accumulator.merge(_accumulate_tracking_file(path))
+    else:
+        # The pipeline runs stages in threads, spawned workers do not fork the other threads' state
+        workers = workers or os.cpu_count()
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=settings) as executor:
+            # Only submit a file once a worker is free, so finished accumulators never pile up
+            pending = set()
+            for path in tracking_paths:
+                if len(pending) >= workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        accumulator.merge(future.result())
+                pending.add(executor.submit(_accumulate_tracking_file, path))
+            for future in wait(pending).done:
+                accumulator.merge(future.result())
+
+    print("Aggregated the heatmaps of " + str(len(tracking_paths)) + " tracking files.")
+    return accumulator
@@ -0,0 +1,122 @@
+"""
+File: partitioned.py
+Out-of-core execution of the preprocessing features over the full season.
+
+create_player_influence and create_distance_to_ball need a whole tracking table in memory plus a merged copy of it.
+Instead of loading every week at once, the tracking CSVs are split into one partition per gameId, and the features
+are run one partition at a time. Only one game is ever held in memory and the results are written to a partitioned
+output directory, so the size of the season is limited by disk instead of RAM.
+"""
+import glob
+import os
+
+import pandas as pd
+
+from cleaning import clean_tracking_data
+from preprocessing import create_acceleration_vectors, create_velocity_vectors, create_player_influence, \
+    create_distance_to_ball
+
+# Features run on every partition when none are given, in order
+DEFAULT_FEATURES = [create_acceleration_vectors, create_velocity_vectors, create_player_influence,
+                    create_distance_to_ball]
+
+
+def _partition_path(directory: str, game_id: int, extension: str = 'csv') -> str:
+    """
+    Helper function for the file name of the partition of a game
+    :param directory: Directory containing the partitions
+    :param game_id: ID of the game
+    :param extension: File extension of the partition
+    :return: Path to the partition
+    """
+    return os.path.join(directory, f'gameId={game_id}.{extension}')
+
+
+def partition_tracking_by_game(tracking_paths: list, partition_dir: str, chunksize: int = 500000) -> list:
+    """
+    Splits tracking CSVs into one CSV per gameId. The CSVs are read in chunks so only chunksize rows are in memory.
+    Existing partitions in partition_dir are replaced.
+    :param tracking_paths: Paths to the weekly tracking CSVs
+    :param partition_dir: Directory to write the partitions to
+    :param chunksize: Number of rows to read from the CSVs at a time
+    :return: List of the paths to the partitions
+    """
+    os.makedirs(partition_dir, exist_ok=True)
+
+    # Rows are appended to the partitions, so start from an empty directory
+    for old_partition in glob.glob(_partition_path(partition_dir, '*')):
+        os.remove(old_partition)
+
+    partition_paths = {}
+    for tracking_path in tracking_paths:
+        for chunk in pd.read_csv(tracking_path, chunksize=chunksize):
+            for game_id, game in chunk.groupby('gameId', sort=False):
+                path = _partition_path(partition_dir, game_id)
+                game.to_csv(path, mode='a', header=game_id not in partition_paths, index=False)
+                partition_paths[game_id] = path
+
+    print("Partitioned the tracking data into " + str(len(partition_paths)) + " games.")
+    return [partition_paths[game_id] for game_id in sorted(partition_paths)]
+
+
+def run_partitioned(partition_paths: list, output_dir: str, features: list = None, clean: bool = True,
+                    overwrite: bool = False, output_format: str = 'csv') -> list:
+    """
+    Runs the feature functions over each partition in turn and writes the result of each one to output_dir
+    :param partition_paths: Paths to the partitions, from partition_tracking_by_game
+    :param output_dir: Directory to write the featurized partitions to
+    :param features: Functions taking and returning a tracking DataFrame, run in order. Defaults to DEFAULT_FEATURES
+    :param clean: Whether to run clean_tracking_data on each partition before the features
+    :param overwrite: If False, partitions that already have an output are skipped so an interrupted run can resume
+    :param output_format: Either 'csv' or 'parquet' (parquet requires pyarrow)
+    :return: List of the paths to the output partitions
+    """
+    if features is None:
+        features = DEFAULT_FEATURES
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    output_paths = []
+    for partition_path in partition_paths:
+        game_id = os.path.basename(partition_path).split('=')[1].split('.')[0]
+        output_path = _partition_path(output_dir, game_id, output_format)
+        output_paths.append(output_path)
+
+        if os.path.exists(output_path) and not overwrite:
+            continue
+
+        tracking = pd.read_csv(partition_path)
+        if clean:
+            tracking = clean_tracking_data(tracking)
+        for feature in features:
+            tracking = feature(tracking)
+
+        # Write to a temporary file first so a crash never leaves a partial partition behind
+        temporary_path = output_path + '.tmp'
+        if output_format == 'parquet':
+            tracking.to_parquet(temporary_path, index=False)
+        else:
+            tracking.to_csv(temporary_path, index=False)
+        os.replace(temporary_path, output_path)
+
+    return output_paths
+
+
+def read_partitioned_output(output_dir: str, game_ids: list = None, output_format: str = 'csv'):
+    """
+    Reads the featurized partitions back one game at a time
+    :param output_dir: Directory containing the output partitions
+    :param game_ids: Games to read, all games if not provided
+    :param output_format: Either 'csv' or 'parquet'
+    :return: Generator of DataFrames, each containing the featurized tracking of one game
+    """
+    if game_ids is None:
+        paths = sorted(glob.glob(_partition_path(output_dir, '*', output_format)))
+    else:
+        paths = [_partition_path(output_dir, game_id, output_format) for game_id in game_ids]
+
+    for path in paths:
+        if output_format == 'parquet':
+            yield pd.read_parquet(path)
+        else:
+            yield pd.read_csv(path)
@@ -0,0 +1,480 @@
+"""
+File: pipeline.py
+Command-line runner for the whole cleaning and preprocessing pipeline.
+
+The pipeline is declared as a graph of stages in STAGES. Each stage names the stages it depends on and a function
+that builds its output from theirs. Every stage's output is checkpointed to disk, so a run that crashes halfway can be
+resumed from the last good checkpoint, and stages whose dependencies are done run concurrently. Each checkpoint is
+stored with a hash of the settings and input files it was built with and of the checkpoints it was built from, so a
+checkpoint built with different settings or data is run again instead of resumed.
+
+Modules are imported inside the stages that need them, so a cleaning-only run does not pay for importing plotly.
+
+Usage:
+    python pipeline.py data/ --checkpoint-dir checkpoints/
+    python pipeline.py data/ --stages games plays
+    python pipeline.py data/ --rerun features
+    python pipeline.py data/ --sample-fraction 0.01
+    python pipeline.py data/ --engine polars
+    python pipeline.py data/ --animate 2022090800 393
+    python pipeline.py data/ --render 2022090800 393 play.gif
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Names of the input files in the data directory
+GAMES_FILE = 'games.csv'
+PLAYS_FILE = 'plays.csv'
+PLAYERS_FILE = 'players.csv'
+TACKLES_FILE = 'tackles.csv'
+TRACKING_FILES = 'tracking_week_*.csv'
+
+
+def _load_table(config: dict, file_name: str, table_name: str, clean_function_name: str, sample=None):
+    """
+    Helper function to read, validate and clean one of the input tables. The quarantined rows are written next to the
+    checkpoints.
+    :param config: Configuration of the run
+    :param file_name: File name of the table in the data directory
+    :param table_name: Name of the table in validation.SCHEMAS
+    :param clean_function_name: Name of the function in cleaning.py that cleans the table
+    :param sample: Optional output of sampling.sample_plays, only the rows of the sampled plays are read
+    :return: Cleaned table
+    """
+    import pandas as pd
+
+    import cleaning
+    import validation
+
+    paths = sorted(glob.glob(os.path.join(config['data_dir'], file_name)))
+    if len(paths) == 0:
+        raise FileNotFoundError(f"No {table_name} data matching {file_name} in {config['data_dir']}.")
+    if sample is not None:
+        import sampling
+        table = sampling.load_sampled_tracking(paths, sample)
+    else:
+        table = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+
+    table, quarantine = validation.validate_table(table, validation.SCHEMAS[table_name], table_name)
+    if len(quarantine) > 0:
+        quarantine.to_csv(os.path.join(config['checkpoint_dir'], f'quarantine_{table_name}.csv'))
+
+    # The date and height parsers in cleaning.py return columns with a fresh index
+    return getattr(cleaning, clean_function_name)(table.reset_index(drop=True))
+
+
+def _stage_games(inputs: dict, config: dict):
+    return _load_table(config, GAMES_FILE, 'games', 'clean_games_data')
+
+
+def _stage_plays(inputs: dict, config: dict):
+    return _load_table(config, PLAYS_FILE, 'plays', 'clean_plays_data')
+
+
+def _stage_players(inputs: dict, config: dict):
+    return _load_table(config, PLAYERS_FILE, 'players', 'clean_players_data')
+
+
+def _stage_tackles(inputs: dict, config: dict):
+    return _load_table(config, TACKLES_FILE, 'tackles', 'clean_tackles_data')
+
+
+def _stage_sample(inputs: dict, config: dict):
+    # Without a sample fraction every play is used
+    if not config.get('sample_fraction'):
+        return None
+
+    import sampling
+
+    return sampling.sample_plays(inputs['plays'], inputs['games'], config['sample_fraction'],
+                                 seed=config.get('sample_seed', 0))
+
+
+def _stage_tracking(inputs: dict, config: dict):
+    return _load_table(config, TRACKING_FILES, 'tracking', 'clean_tracking_data', sample=inputs['sample'])
+
+
+def _stage_integrity(inputs: dict, config: dict):
+    import cleaning
+
+    # Checked before any repair, so the report shows the defects of the data as it was delivered
+    return cleaning.check_tracking_integrity(inputs['tracking'])
+
+
+def _stage_repaired_tracking(inputs: dict, config: dict):
+    # Without repair the tracking stage is used as is, instead of checkpointing a second copy of it
+    if not config.get('repair'):
+        return None
+
+    import cleaning
+
+    return cleaning.repair_tracking(inputs['tracking'])
+
+
+def _tracking_input(inputs: dict):
+    return inputs['tracking'] if inputs['repaired_tracking'] is None else inputs['repaired_tracking']
+
+
+def _stage_checked_plays(inputs: dict, config: dict):
+    import cleaning
+
+    plays = inputs['plays']
+    if inputs['sample'] is not None:
+        import sampling
+        plays = sampling.filter_to_sample(plays, inputs['sample'])
+
+    return cleaning.check_for_ball_carrier(plays, _tracking_input(inputs))
+
+
+def _stage_left_to_right(inputs: dict, config: dict):
+    import preprocessing
+
+    return preprocessing.all_plays_left_to_right(inputs['checked_plays'], _tracking_input(inputs))
+
+
+def _stage_features(inputs: dict, config: dict):
+    import preprocessing
+
+    _, tracking = inputs['left_to_right']
+    if config.get('crop'):
+        tracking = preprocessing.crop_to_event_window(tracking)
+    if config.get('resample_hz'):
+        tracking = preprocessing.resample_tracking(tracking, frequency=config['resample_hz'])
+
+    tracking = preprocessing.create_acceleration_vectors(tracking)
+    tracking = preprocessing.create_velocity_vectors(tracking)
+    tracking = preprocessing.create_player_influence(tracking)
+    tracking = preprocessing.create_distance_to_ball(tracking)
+    return tracking
+
+
+def _stage_play_summary(inputs: dict, config: dict):
+    import preprocessing
+
+    # Resampled frames are 1 / resample_hz apart instead of the 0.1s of the raw tracking
+    frame_interval = 1 / config['resample_hz'] if config.get('resample_hz') else 0.1
+    return preprocessing.create_play_influence_summary(inputs['features'], inputs['tackles'],
+                                                       frame_interval=frame_interval)
+
+
+def _stage_carrier_frame(inputs: dict, config: dict):
+    import preprocessing
+
+    plays, tracking = inputs['left_to_right']
+    carrier_frame = preprocessing.create_ball_carrier_frame(tracking, plays)
+
+    # Only the keys and the relative features are kept, the rest of the tracking is in the left_to_right checkpoint
+    carrier_columns = [column for column in carrier_frame.columns if column.startswith('carrier_')]
+    return carrier_frame[['gameId', 'playId', 'nflId', 'frameId'] + carrier_columns].reset_index(drop=True)
+
+
+def _stage_heatmaps(inputs: dict, config: dict):
+    import heatmaps
+
+    # The tracking CSVs are streamed week by week instead of using the tracking stage, which holds them all in memory
+    paths = sorted(glob.glob(os.path.join(config['data_dir'], TRACKING_FILES)))
+    return heatmaps.aggregate_heatmaps(paths, inputs['plays'], inputs['players'], sample=inputs['sample'])
+
+
+# The pipeline, each stage maps to the stages it depends on and the function that runs it
+STAGES = {
+    'games': ([], _stage_games),
+    'plays': ([], _stage_plays),
+    'players': ([], _stage_players),
+    'tackles': ([], _stage_tackles),
+    'sample': (['games', 'plays'], _stage_sample),
+    'tracking': (['sample'], _stage_tracking),
+    'integrity': (['tracking'], _stage_integrity),
+    'repaired_tracking': (['tracking', 'integrity'], _stage_repaired_tracking),
+    'checked_plays': (['plays', 'tracking', 'repaired_tracking', 'sample'], _stage_checked_plays),
+    'left_to_right': (['checked_plays', 'tracking', 'repaired_tracking'], _stage_left_to_right),
+    'features': (['left_to_right'], _stage_features),
+    'play_summary': (['features', 'tackles'], _stage_play_summary),
+    'carrier_frame': (['left_to_right'], _stage_carrier_frame),
+    'heatmaps': (['plays', 'players', 'sample'], _stage_heatmaps)
+}
+
+# Settings of the run that change the output of every stage
+GLOBAL_SETTINGS = ['data_dir', 'precision', 'engine']
+
+# Input files each stage reads from the data directory, their paths, sizes and modification times are part of its hash
+STAGE_INPUTS = {
+    'games': [GAMES_FILE],
+    'plays': [PLAYS_FILE],
+    'players': [PLAYERS_FILE],
+    'tackles': [TACKLES_FILE],
+    'tracking': [TRACKING_FILES],
+    'heatmaps': [TRACKING_FILES]
+}
+
+# Settings of the run that change the output of a single stage, and through it every stage downstream
+STAGE_SETTINGS = {
+    'sample': ['sample_fraction', 'sample_seed'],
+    'repaired_tracking': ['repair'],
+    'features': ['crop', 'resample_hz'],
+    'play_summary': ['resample_hz']
+}
+
+
+def required_stages(targets: list, stages: dict = None) -> list:
+    """
+    Finds the stages needed to produce the target stages, in an order where every stage comes after its dependencies
+    :param targets: Names of the stages to produce
+    :param stages: Stage graph, defaults to STAGES
+    :return: List of stage names
+    """
+    if stages is None:
+        stages = STAGES
+
+    ordered = []
+
+    def visit(stage):
+        if stage not in stages:
+            raise ValueError(f"Unknown stage {stage}, expected one of {list(stages)}.")
+        if stage in ordered:
+            return
+        for dependency in stages[stage][0]:
+            visit(dependency)
+        ordered.append(stage)
+
+    for target in targets:
+        visit(target)
+    return ordered
+
+
+def dependent_stages(stage_names: list, stages: dict = None) -> set:
+    """
+    Finds the stages that depend on the given stages, directly or not, including the given stages
+    :param stage_names: Names of the stages
+    :param stages: Stage graph, defaults to STAGES
+    :return: Set of stage names
+    """
+    if stages is None:
+        stages = STAGES
+
+    dependents = set(stage_names)
+    changed = True
+    while changed:
+        changed = False
+        for stage, (dependencies, _) in stages.items():
+            if stage not in dependents and dependents.intersection(dependencies):
+                dependents.add(stage)
+                changed = True
+    return dependents
+
+
+def _stage_hashes(needed: list, config: dict, stages: dict) -> dict:
+    """
+    Helper function to fingerprint the output of every needed stage. A stage's hash covers its settings, the input files
+    it reads and the hashes of the stages it depends on, so changing a setting or an input file changes the hash of
+    the stage and of everything downstream.
+    :param needed: Names of the stages, every stage after its dependencies
+    :param config: Configuration of the run
+    :param stages: Stage graph
+    :return: Dictionary with the hash of every stage
+    """
+    hashes = {}
+    for stage in needed:
+        settings = {key: config.get(key) for key in GLOBAL_SETTINGS + STAGE_SETTINGS.get(stage, [])}
+        if settings.get('data_dir') is not None:
+            settings['data_dir'] = os.path.abspath(settings['data_dir'])
+        dependencies = {dependency: hashes[dependency] for dependency in stages[stage][0]}
+
+        # Editing or replacing an input file changes the hash of the stage that reads it
+        inputs = []
+        if config.get('data_dir') is not None:
+            for file_name in STAGE_INPUTS.get(stage, []):
+                for path in sorted(glob.glob(os.path.join(config['data_dir'], file_name))):
+                    status = os.stat(path)
+                    inputs.append([os.path.basename(path), status.st_size, status.st_mtime_ns])
+
+        fingerprint = json.dumps({'stage': stage, 'settings': settings, 'dependencies': dependencies,
+                                  'inputs': inputs}, sort_keys=True, default=str)
+        hashes[stage] = hashlib.sha256(fingerprint.encode()).hexdigest()
+    return hashes
+
+
+def _checkpoint_path(checkpoint_dir: str, stage: str) -> str:
+    return os.path.join(checkpoint_dir, f'{stage}.pkl')
+
+
+def _hash_path(checkpoint_dir: str, stage: str) -> str:
+    return os.path.join(checkpoint_dir, f'{stage}.hash')
+
+
+def _checkpoint_is_current(checkpoint_dir: str, stage: str, stage_hash: str) -> bool:
+    # A checkpoint without a hash, or built with other settings, counts as missing
+    if not os.path.exists(_checkpoint_path(checkpoint_dir, stage)) or \
+            not os.path.exists(_hash_path(checkpoint_dir, stage)):
+        return False
+    with open(_hash_path(checkpoint_dir, stage)) as hash_file:
+        return hash_file.read().strip() == stage_hash
+
+
+def _read_checkpoint(checkpoint_dir: str, stage: str):
+    with open(_checkpoint_path(checkpoint_dir, stage), 'rb') as checkpoint:
+        return pickle.load(checkpoint)
+
+
+def _write_checkpoint(checkpoint_dir: str, stage: str, output, stage_hash: str):
+    # Write to a temporary file first so a crash never leaves a partial checkpoint that looks good
+    path = _checkpoint_path(checkpoint_dir, stage)
+    with open(path + '.tmp', 'wb') as checkpoint:
+        pickle.dump(output, checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+    # The hash is written last, a crash in between leaves a checkpoint that is run again
+    with open(_hash_path(checkpoint_dir, stage) + '.tmp', 'w') as hash_file:
+        hash_file.write(stage_hash)
+    os.replace(_hash_path(checkpoint_dir, stage) + '.tmp', _hash_path(checkpoint_dir, stage))
+
+
+def run_pipeline(config: dict, targets: list = None, rerun: list = None, workers: int = 4,
+                 stages: dict = None) -> dict:
+    """
+    Runs the stages needed for the targets. Stages with a checkpoint built with the same settings are loaded instead of
+    run, and stages whose dependencies are all done run concurrently.
+    :param config: Configuration of the run, must contain data_dir and checkpoint_dir. The precision and engine are
+    taken from the current policies
+    :param targets: Names of the stages to produce, defaults to every stage
+    :param rerun: Names of stages to run again even if they have a checkpoint, along with the stages that depend on
+    them
+    :param workers: Number of stages that can run at the same time
+    :param stages: Stage graph, defaults to STAGES
+    :return: Dictionary with the output of every stage that was needed
+    """
+    if stages is None:
+        stages = STAGES
+    if targets is None:
+        targets = list(stages)
+
+    import engines
+    import precision
+
+    # The stages read the precision and engine from the policies, so those are the settings they are built with
+    config = dict(config, precision=precision.get_precision(), engine=engines.get_engine())
+
+    checkpoint_dir = config['checkpoint_dir']
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    needed = required_stages(targets, stages)
+    hashes = _stage_hashes(needed, config, stages)
+    invalid = dependent_stages(rerun or [], stages)
+    pending = [stage for stage in needed
+               if stage in invalid or not _checkpoint_is_current(checkpoint_dir, stage, hashes[stage])]
+    done = [stage for stage in needed if stage not in pending]
+
+    # Only load the checkpoints of finished stages when something still needs them
+    outputs = {}
+
+    def load_output(stage):
+        if stage not in outputs:
+            print(f"Resuming {stage} from its checkpoint.")
+            outputs[stage] = _read_checkpoint(checkpoint_dir, stage)
+        return outputs[stage]
+
+    for stage in targets:
+        if stage in done:
+            load_output(stage)
+
+    def run_stage(stage, inputs):
+        start = time.perf_counter()
+        output = stages[stage][1](inputs, config)
+        _write_checkpoint(checkpoint_dir, stage, output, hashes[stage])
+        print(f"Finished {stage} in {time.perf_counter() - start:.1f} seconds.")
+        return output
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            # Start every stage whose dependencies are finished
+            for stage in list(pending):
+                dependencies = stages[stage][0]
+                if all(dependency in done for dependency in dependencies):
+                    inputs = {dependency: load_output(dependency) for dependency in dependencies}
+                    running[executor.submit(run_stage, stage, inputs)] = stage
+                    pending.remove(stage)
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                # Raises the error of a failed stage, the checkpoints of finished stages are kept for the next run
+                outputs[stage] = future.result()
+                done.append(stage)
+
+    return outputs
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description='Run the cleaning and preprocessing pipeline over a data directory.')
+    parser.add_argument('data_dir', help='Directory containing games.csv, plays.csv, players.csv, tackles.csv and '
+                                         'the tracking_week_*.csv files')
+    parser.add_argument('--checkpoint-dir', default='checkpoints', help='Directory to write the stage checkpoints to')
+    parser.add_argument('--stages', nargs='+', default=None, choices=list(STAGES),
+                        help='Stages to produce, along with the stages they depend on. Defaults to every stage')
+    parser.add_argument('--rerun', nargs='+', default=[], choices=list(STAGES),
+                        help='Stages to run again even if they have a checkpoint')
+    parser.add_argument('--workers', type=int, default=4, help='Number of stages that can run at the same time')
+    parser.add_argument('--precision', choices=['float32', 'float64'], default='float32',
+                        help='Floating point precision of the pipeline')
+    parser.add_argument('--engine', choices=['pandas', 'polars'], default='pandas',
+                        help='Engine of the cleaning and feature stages, polars requires polars and pyarrow')
+    parser.add_argument('--sample-fraction', type=float, default=None,
+                        help='Only run a stratified sample of this fraction of the plays, e.g. 0.01. Changing or '
+                             'dropping it reruns the sample and every stage after it')
+    parser.add_argument('--sample-seed', type=int, default=0, help='Seed of the play sample')
+    parser.add_argument('--repair', action='store_true',
+                        help='Remove duplicate tracking rows and interpolate short gaps in the frames after the '
+                             'integrity checks')
+    parser.add_argument('--crop', action='store_true',
+                        help='Crop the tracking to the event window of each play before the features')
+    parser.add_argument('--resample-hz', type=float, default=None,
+                        help='Resample the tracking onto a grid of this frequency aligned to the snap before the '
+                             'features, e.g. 5')
+    parser.add_argument('--animate', nargs=2, type=int, metavar=('GAME_ID', 'PLAY_ID'),
+                        help='Animate a play with the features once the pipeline is done')
+    parser.add_argument('--render', nargs=3, metavar=('GAME_ID', 'PLAY_ID', 'OUTPUT'),
+                        help='Render a play with the features to a .gif, .mp4 or a directory of PNG frames without a '
+                             'display once the pipeline is done')
+    args = parser.parse_args(argv)
+
+    import engines
+    import precision
+    engines.set_engine(args.engine)
+    precision.set_precision(args.precision)
+
+    config = {'data_dir': args.data_dir, 'checkpoint_dir': args.checkpoint_dir, 'crop': args.crop,
+              'repair': args.repair, 'resample_hz': args.resample_hz,
+              'sample_fraction': args.sample_fraction, 'sample_seed': args.sample_seed}
+
+    targets = args.stages
+    if args.animate or args.render:
+        targets = (targets or []) + ['games', 'left_to_right', 'features']
+
+    outputs = run_pipeline(config, targets=targets, rerun=args.rerun, workers=args.workers)
+
+    if args.animate:
+        # plotly is only imported when a play is animated
+        import visualizations
+
+        plays, _ = outputs['left_to_right']
+        visualizations.animate_play(outputs['games'], plays, outputs['features'], args.animate[0], args.animate[1],
+                                    acceleration=True, velocity=True)
+
+    if args.render:
+        # matplotlib is only imported when a play is rendered
+        import rendering
+
+        plays, _ = outputs['left_to_right']
+        rendering.render_play(outputs['games'], plays, outputs['features'], int(args.render[0]), int(args.render[1]),
+                              args.render[2], acceleration=True, velocity=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""
+File: polars_engine.py
+Multithreaded columnar implementations of the cleaning casts, the ball carrier, snap and play end checks, the football
+join and the vector features, used by cleaning.py and preprocessing.py when engines.set_engine('polars') is called.
+
+Every function has the same signature as its pandas version. They accept a pandas DataFrame, a polars DataFrame or a
+pyarrow Table and return the same kind of table they were given, so the rest of the pipeline does not change.
+
+Requires polars and pyarrow. Run this file to benchmark both engines over a range of thread counts:
+    python polars_engine.py tracking_week_1.csv --threads 1 2 4 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+import polars as pl
+import pyarrow as pa
+
+from cleaning import PLAY_END_EVENTS
+from precision import get_float_dtype
+from preprocessing import MAX_SPEED, INFLUENCE_RADIUS, _calculate_influence_lookup
+
+# Columns the football is joined to the players on, same as the pandas merge
+FOOTBALL_JOIN_KEYS = ['gameId', 'playId', 'frameId', 'time', 'playDirection']
+
+
+def _to_polars(table) -> tuple[pl.DataFrame, str]:
+    """
+    Helper function to convert a table to a polars DataFrame and remember what kind of table it was
+    :param table: pandas DataFrame, polars DataFrame or pyarrow Table
+    :return: Tuple of the polars DataFrame and the kind of table
+    """
+    if isinstance(table, pl.DataFrame):
+        return table, 'polars'
+    if isinstance(table, pa.Table):
+        return pl.from_arrow(table), 'arrow'
+    return pl.from_pandas(table), 'pandas'
+
+
+def _from_polars(data: pl.DataFrame, kind: str):
+    """
+    Helper function to convert a polars DataFrame back to the kind of table the function was given
+    :param data: polars DataFrame
+    :param kind: Kind of table from _to_polars
+    :return: pandas DataFrame, polars DataFrame or pyarrow Table
+    """
+    if kind == 'polars':
+        return data
+    if kind == 'arrow':
+        return data.to_arrow()
+    return data.to_pandas()
+
+
+def _float_type():
+    # polars type matching the precision policy
+    return pl.Float32 if get_float_dtype() == 'float32' else pl.Float64
+
+
+def clean_plays_data(plays):
+    """
+    Clean plays data-- drop the plays nullified by penalty or missing expectedPointsAdded or defendersInTheBox and
+    downcast the integers and floats
+    :param plays: Raw plays dataset
+    :return: Cleaned plays dataset
+    """
+    data, kind = _to_polars(plays)
+
+    # ne_missing keeps the plays with a missing playNullifiedByPenalty, like the pandas query
+    data = data.filter(pl.col('playNullifiedByPenalty').ne_missing('Y') &
+                       pl.col('expectedPointsAdded').is_not_null() &
+                       pl.col('defendersInTheBox').is_not_null())
+
+    plays_columns_to_convert_to_int = ['gameId', 'playId', 'ballCarrierId', 'quarter', 'down', 'yardsToGo',
+                                       'yardlineNumber', 'preSnapHomeScore', 'preSnapVisitorScore',
+                                       'prePenaltyPlayResult', 'playResult', 'absoluteYardlineNumber']
+    plays_columns_to_convert_to_float = ['passLength', 'penaltyYards', 'defendersInTheBox', 'passProbability',
+                                         'preSnapHomeTeamWinProbability', 'preSnapVisitorTeamWinProbability',
+                                         'homeTeamWinProbabilityAdded', 'visitorTeamWinProbilityAdded',
+                                         'expectedPoints', 'expectedPointsAdded']
+    data = data.with_columns([pl.col(plays_columns_to_convert_to_int).cast(pl.Int32),
+                              pl.col(plays_columns_to_convert_to_float).cast(_float_type())])
+
+    print("Plays data has been cleaned with polars, " + str(data.height) + " plays remain.")
+    return _from_polars(data, kind)
+
+
+def clean_tracking_data(tracking):
+    """
+    Clean tracking data-- downcast the integers and floats and convert the time of the frame into a datetime
+    :param tracking: Raw tracking data
+    :return: Cleaned tracking data
+    """
+    data, kind = _to_polars(tracking)
+
+    time_column = pl.col('time')
+    if data.schema['time'] == pl.String:
+        time_column = time_column.str.to_datetime()
+
+    data = data.with_columns([pl.col(['gameId', 'playId', 'frameId']).cast(pl.Int32),
+                              pl.col(['x', 'y', 'a', 's', 'o', 'dir', 'dis']).cast(_float_type()),
+                              time_column.cast(pl.Datetime('ns'))])
+
+    print("Tracking data has been cleaned with polars.")
+    return _from_polars(data, kind)
+
+
+def clean_tackles_data(tackles):
+    """
+    Clean tackles data-- downcast the integers
+    :param tackles: Raw tackles dataset
+    :return: Cleaned tackles dataset
+    """
+    data, kind = _to_polars(tackles)
+
+    data = data.with_columns(pl.col(['gameId', 'playId', 'nflId', 'tackle', 'assist', 'forcedFumble',
+                                     'pff_missedTackle']).cast(pl.Int32))
+
+    print("Tackles data has been cleaned with polars.")
+    return _from_polars(data, kind)
+
+
+def check_for_ball_carrier(plays, tracking):
+    """
+    Checks if the ball carrier is in the tracking data, with one join instead of a loop over the plays
+    :param plays: Dataframe containing plays
+    :param tracking: Dataframe containing tracking data
+    :return: Plays dataframe containing only plays that the ball carrier is in the tracking data
+    """
+    plays_data, kind = _to_polars(plays)
+    tracking_data, _ = _to_polars(tracking)
+
+    tracked_players = (tracking_data.select(['gameId', 'playId', 'nflId'])
+                       .filter(pl.col('nflId').is_not_null())
+                       .unique()
+                       .with_columns(pl.col('nflId').cast(pl.Int64).alias('ballCarrierId'),
+                                     pl.col(['gameId', 'playId']).cast(pl.Int64))
+                       .drop('nflId'))
+
+    final_plays = plays_data.join(tracked_players, left_on=[pl.col('gameId').cast(pl.Int64),
+                                                            pl.col('playId').cast(pl.Int64),
+                                                            pl.col('ballCarrierId').cast(pl.Int64)],
+                                  right_on=['gameId', 'playId', 'ballCarrierId'], how='semi', maintain_order='left')
+
+    print("Removed " + str(plays_data.height - final_plays.height) +
+          " plays that do not have the ball carrier in the frames.")
+    return _from_polars(final_plays, kind)
+
+
+def _plays_with_events(plays, tracking, events: list):
+    """
+    Helper function to keep the plays that have any of the events in their tracking, with one semi-join over the event
+    rows instead of a loop over the plays
+    :param plays: Dataframe containing plays
+    :param tracking: Dataframe containing tracking data
+    :param events: Names of the events to look for
+    :return: Polars plays dataframe, the kind of table plays was given as and the number of plays removed
+    """
+    plays_data, kind = _to_polars(plays)
+    tracking_data, _ = _to_polars(tracking)
+
+    plays_with_events = (tracking_data.select(['gameId', 'playId', 'event'])
+                         .filter(pl.col('event').is_in(events))
+                         .select(pl.col(['gameId', 'playId']).cast(pl.Int64))
+                         .unique())
+
+    final_plays = plays_data.join(plays_with_events, left_on=[pl.col('gameId').cast(pl.Int64),
+                                                              pl.col('playId').cast(pl.Int64)],
+                                  right_on=['gameId', 'playId'], how='semi', maintain_order='left')
+    return final_plays, kind, plays_data.height - final_plays.height
+
+
+def check_for_snap(plays, tracking):
+    """
+    Checks if there is tracking data when the ball is snapped for each play, with one semi-join instead of a loop over
+    the plays
+    :param plays: Dataframe containing plays
+    :param tracking: Dataframe containing tracking data
+    :return: Plays dataframe containing only plays that tracking starts before the snap of the ball
+    """
+    final_plays, kind, removed = _plays_with_events(plays, tracking, ['ball_snap'])
+    print("Removed " + str(removed) + " plays that do not have tracking at the snap of the ball.")
+    return _from_polars(final_plays, kind)
+
+
+def check_for_end(plays, tracking):
+    """
+    Checks if there is tracking data when the play ends for each play, with one semi-join instead of a loop over the
+    plays
+    :param plays: Dataframe containing plays
+    :param tracking: Dataframe containing tracking data
+    :return: Plays dataframe containing only plays that tracking ends after the play ends
+    """
+    final_plays, kind, removed = _plays_with_events(plays, tracking, PLAY_END_EVENTS)
+    print("Removed " + str(removed) + " plays that do not have tracking for the end of the play.")
+    return _from_polars(final_plays, kind)
+
+
+def _with_direction(data: pl.DataFrame) -> pl.DataFrame:
+    # Convert direction from degrees to radians
+    return data.with_columns(pl.col('dir').cast(_float_type()).radians().alias('dir_rad'))
+
+
+def create_acceleration_vectors(tracking):
+    """
+    Creates acceleration vectors and their corresponding (x,y) components for each frame in the tracking data
+    :param tracking: Dataset of NFL player tracking data
+    :return: Dataset with NFL player tracking data with acceleration components added to both x and y
+    """
+    data, kind = _to_polars(tracking)
+    data = _with_direction(data)
+
+    acceleration = pl.col('a').cast(_float_type())
+    data = data.with_columns((acceleration * pl.col('dir_rad').sin()).alias('x_acceleration_component'),
+                             (acceleration * pl.col('dir_rad').cos()).alias('y_acceleration_component'))
+
+    return _from_polars(data, kind)
+
+
+def create_velocity_vectors(tracking):
+    """
+    Creates velocity vectors and their corresponding (x,y) components for each frame in the tracking data
+    :param tracking: Dataset of NFL player tracking data
+    :return: Dataset with NFL player tracking data with velocity components added to both x and y
+    """
+    data, kind = _to_polars(tracking)
+    data = _with_direction(data)
+
+    speed = pl.col('s').cast(_float_type())
+    data = data.with_columns((speed * pl.col('dir_rad').sin()).alias('x_velocity_component'),
+                             (speed * pl.col('dir_rad').cos()).alias('y_velocity_component'))
+
+    return _from_polars(data, kind)
+
+
+def _join_football(data: pl.DataFrame) -> pl.DataFrame:
+    """
+    Helper function to join the position of the football in each frame onto every row of that frame. Only the
+    football's position is joined, so there is nothing to unmerge afterwards.
+    :param data: Tracking data
+    :return: Tracking data with the x_football and y_football columns, frames without the football are dropped
+    """
+    football = (data.filter(pl.col('displayName') == 'football')
+                .select(FOOTBALL_JOIN_KEYS + [pl.col('x').alias('x_football'), pl.col('y').alias('y_football')]))
+    return data.join(football, on=FOOTBALL_JOIN_KEYS, how='inner')
+
+
+def create_player_influence(tracking, approximate=False):
+    """
+    Computes the degree of influence for each player on the ball carrier.
+    :param tracking: DataFrame containing the tracking data.
+    :param approximate: Whether to use the lookup tables of preprocessing._calculate_influence_lookup
+    :return: DataFrame with column for the degree of influence the player has on the ball
+    """
+    data, kind = _to_polars(tracking)
+    data = _join_football(data)
+
+    float_type = _float_type()
+    if approximate:
+        # The lookup tables are gathered with numpy on the joined columns
+        influence = _calculate_influence_lookup(
+            *[data[column].cast(float_type).to_numpy() for column in ['x', 'y', 's', 'dir_rad', 'x_football',
+                                                                      'y_football']])
+        data = data.with_columns(pl.Series('influence_degree', influence)).drop(['x_football', 'y_football'])
+        return _from_polars(data, kind)
+
+    x, y, s = pl.col('x').cast(float_type), pl.col('y').cast(float_type), pl.col('s').cast(float_type)
+    cos_dir, sin_dir = pl.col('dir_rad').cast(float_type).cos(), pl.col('dir_rad').cast(float_type).sin()
+
+    # Same closed form as preprocessing._calculate_influence_vectorized
+    sx = (INFLUENCE_RADIUS + (INFLUENCE_RADIUS * s) / MAX_SPEED) / 2
+    sy = (INFLUENCE_RADIUS - (INFLUENCE_RADIUS * s) / MAX_SPEED) / 2
+    diff_x = pl.col('x_football').cast(float_type) - (x + cos_dir * s * 0.5)
+    diff_y = pl.col('y_football').cast(float_type) - (y + sin_dir * s * 0.5)
+    u = cos_dir * diff_x + sin_dir * diff_y
+    v = -sin_dir * diff_x + cos_dir * diff_y
+    influence = (1 / (2 * 3.141592653589793 * sx * sy)) * (-0.5 * ((u / sx) ** 2 + (v / sy) ** 2)).exp()
+
+    data = data.with_columns(influence.cast(float_type).alias('influence_degree')).drop(['x_football', 'y_football'])
+
+    return _from_polars(data, kind)
+
+
+def create_distance_to_ball(tracking):
+    """
+    Creates distance from each player to the ball.
+    :param tracking: DataFrame containing the tracking data.
+    :return: DataFrame containing the tracking data with column added for the distance to the ball
+    """
+    data, kind = _to_polars(tracking)
+    data = _join_football(data)
+
+    distance = ((pl.col('x') - pl.col('x_football')) ** 2 + (pl.col('y') - pl.col('y_football')) ** 2).sqrt()
+    data = data.with_columns(distance.cast(_float_type()).alias('player_to_football_distance'))
+    data = data.drop(['x_football', 'y_football'])
+
+    return _from_polars(data, kind)
+
+
+def _benchmark_worker(tracking_path: str, repeats: int) -> dict:
+    """
+    Helper function to time the tracking stages on both engines in this process
+    :param tracking_path: Path to a tracking CSV
+    :param repeats: Number of times to run each engine, the fastest is kept
+    :return: Dictionary with the fastest time in seconds of each engine
+    """
+    import cleaning
+    import preprocessing
+    from engines import use_engine
+
+    raw = pd.read_csv(tracking_path)
+    timings = {}
+    for engine in ['pandas', 'polars']:
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            with use_engine(engine):
+                tracking = cleaning.clean_tracking_data(raw.copy())
+                tracking = preprocessing.create_acceleration_vectors(tracking)
+                tracking = preprocessing.create_velocity_vectors(tracking)
+                tracking = preprocessing.create_player_influence(tracking)
+                preprocessing.create_distance_to_ball(tracking)
+            best = min(best, time.perf_counter() - start)
+        timings[engine] = best
+    return timings
+
+
+def benchmark_engines(tracking_path: str, thread_counts: list = (1, 2, 4, 8), repeats: int = 3) -> pd.DataFrame:
+    """
+    Benchmarks both engines on a tracking CSV with different numbers of threads. polars fixes its thread pool when it
+    is imported, so every thread count runs in a new process.
+    :param tracking_path: Path to a tracking CSV
+    :param thread_counts: Numbers of threads to give polars
+    :param repeats: Number of times to run each engine, the fastest is kept
+    :return: DataFrame with the time of each engine for every thread count and the speedup of polars
+    """
+    results = []
+    for threads in thread_counts:
+        environment = dict(os.environ, POLARS_MAX_THREADS=str(threads))
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), tracking_path, '--worker',
+                                 '--repeats', str(repeats)],
+                                env=environment, capture_output=True, text=True, check=True).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        results.append({'threads': threads, 'pandas_seconds': timings['pandas'],
+                        'polars_seconds': timings['polars']})
+
+    results = pd.DataFrame(results)
+    results['speedup'] = results['pandas_seconds'] / results['polars_seconds']
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pandas and polars engines on a tracking CSV.')
+    parser.add_argument('tracking_path', help='Path to a tracking CSV')
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, 2, 4, 8], help='Thread counts to benchmark')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per engine, the fastest is kept')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(_benchmark_worker(args.tracking_path, args.repeats)))
+    else:
+        print(benchmark_engines(args.tracking_path, args.threads, args.repeats).to_string(index=False))
@@ -0,0 +1,58 @@
+"""
+File: precision.py
+Pipeline-wide floating point precision policy.
+
+'float32' (the default) keeps every float column of the cleaning and preprocessing functions in single precision,
+which halves the memory and memory bandwidth of the large feature stages. 'float64' keeps them in double precision
+for exact results. The functions in cleaning.py and preprocessing.py read the policy with get_float_dtype and cast
+their outputs to it, so results are not silently upcast along the way.
+"""
+from contextlib import contextmanager
+
+import numpy as np
+
+PRECISIONS = {
+    'float32': np.dtype('float32'),
+    'float64': np.dtype('float64')
+}
+
+_precision = 'float32'
+
+
+def set_precision(precision: str):
+    """
+    Sets the precision used by the whole pipeline
+    :param precision: Either 'float32' (compact) or 'float64' (exact)
+    """
+    global _precision
+    if precision not in PRECISIONS:
+        raise ValueError(f"Precision must be one of {list(PRECISIONS)}, not {precision}.")
+    _precision = precision
+
+
+def get_precision() -> str:
+    """
+    :return: Name of the precision used by the pipeline
+    """
+    return _precision
+
+
+def get_float_dtype() -> np.dtype:
+    """
+    :return: Numpy dtype of the precision used by the pipeline
+    """
+    return PRECISIONS[_precision]
+
+
+@contextmanager
+def use_precision(precision: str):
+    """
+    Temporarily sets the precision used by the pipeline, e.g. with use_precision('float64'): ...
+    :param precision: Either 'float32' (compact) or 'float64' (exact)
+    """
+    previous = _precision
+    set_precision(precision)
+    try:
+        yield
+    finally:
+        set_precision(previous)
@@ -8,9 +8,30 @@ https://static.capabiliaserver.com/frontend/clients/barca/wp_prod/wp-content/upl
 Influence implementation based on spatial.py mpchang
 https://github.com/mpchang/uncovering-missed-tackle-opportunities/blob/main/code/spatial.py
 """
+import argparse
+import time
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
 
+from engines import get_engine
+from precision import get_float_dtype
+
+# Constants for the influence model
+MAX_SPEED = 18
+INFLUENCE_RADIUS = 10
+
+# Resolution of the lookup table of the approximate influence, in yards per second and bins per full turn
+INFLUENCE_SPEED_STEP = 0.05
+INFLUENCE_DIRECTION_BINS = 720
+
+# Width in yards of the cells the points of create_influence_field are bucketed in
+INFLUENCE_CELL_SIZE = 4.0
+
+# Events that mark the phases of a play that the tackle analysis uses
+KEY_EVENTS = ['ball_snap', 'handoff', 'pass_outcome_caught', 'tackle', 'out_of_bounds', 'touchdown']
+
 
 def create_acceleration_vectors(tracking: pd.DataFrame):
     """
@@ -18,13 +39,20 @@ def create_acceleration_vectors(tracking: pd.DataFrame):
     :param tracking: Dataset of NFL player tracking data
     :return: Dataset with NFL player tracking data with acceleration components added to both x and y
     """
+    if get_engine() == 'polars':
+        import polars_engine
+        return polars_engine.create_acceleration_vectors(tracking)
+
     tracking_copy = tracking.copy()
+    float_dtype = get_float_dtype()
+
     # Convert direction from degrees to radians
-    tracking_copy['dir_rad'] = np.radians(tracking_copy['dir'])
+    tracking_copy['dir_rad'] = np.radians(tracking_copy['dir'].astype(float_dtype))
 
     # Calculate the acceleration vectors
-    tracking_copy['x_acceleration_component'] = (tracking_copy['a'] * np.sin(tracking_copy['dir_rad']))
-    tracking_copy['y_acceleration_component'] = (tracking_copy['a'] * np.cos(tracking_copy['dir_rad']))
+    acceleration = tracking_copy['a'].astype(float_dtype)
+    tracking_copy['x_acceleration_component'] = (acceleration * np.sin(tracking_copy['dir_rad']))
+    tracking_copy['y_acceleration_component'] = (acceleration * np.cos(tracking_copy['dir_rad']))
 
     return tracking_copy
 
@@ -35,23 +63,25 @@ def create_velocity_vectors(tracking: pd.DataFrame):
     :param tracking: Dataset of NFL player tracking data
     :return: Dataset with NFL player tracking data with velocity components added to both x and y
     """
+    if get_engine() == 'polars':
+        import polars_engine
+        return polars_engine.create_velocity_vectors(tracking)
+
     tracking_copy = tracking.copy()
+    float_dtype = get_float_dtype()
 
     # Convert direction from degrees to radians
-    tracking_copy['dir_rad'] = np.radians(tracking_copy['dir'])
+    tracking_copy['dir_rad'] = np.radians(tracking_copy['dir'].astype(float_dtype))
 
     # Calculate the change in position based on velocity
-    tracking_copy['x_velocity_component'] = (tracking_copy['s'] * np.sin(tracking_copy['dir_rad']))
-    tracking_copy['y_velocity_component'] = (tracking_copy['s'] * np.cos(tracking_copy['dir_rad']))
+    speed = tracking_copy['s'].astype(float_dtype)
+    tracking_copy['x_velocity_component'] = (speed * np.sin(tracking_copy['dir_rad']))
+    tracking_copy['y_velocity_component'] = (speed * np.cos(tracking_copy['dir_rad']))
 
     return tracking_copy
 
 
 def _calculate_influence(row):
-    # Constants
-    MAX_SPEED = 18
-    INFLUENCE_RADIUS = 10
-
     # Calculate scaling factors
     sx = (INFLUENCE_RADIUS + (INFLUENCE_RADIUS * row['s_player']) / MAX_SPEED) / 2
     sy = (INFLUENCE_RADIUS - (INFLUENCE_RADIUS * row['s_player']) / MAX_SPEED) / 2
@@ -81,12 +111,206 @@ def _calculate_influence(row):
     return gaussian_pdf
 
 
-def create_player_influence(tracking: pd.DataFrame) -> pd.DataFrame:
+def _calculate_influence_vectorized(x_player, y_player, s_player, dir_rad_player, x_target, y_target):
+    """
+    Array version of _calculate_influence. Evaluates the same Gaussian for every element at once by using the closed
+    form of the rotated covariance instead of building and inverting a 2x2 matrix per row.
+    :param x_player: Array of player x positions
+    :param y_player: Array of player y positions
+    :param s_player: Array of player speeds
+    :param dir_rad_player: Array of player directions in radians
+    :param x_target: Array of x positions to evaluate the influence at (e.g. the football)
+    :param y_target: Array of y positions to evaluate the influence at (e.g. the football)
+    :return: Array with the degree of influence of each player on each target
+    """
+    # Calculate scaling factors
+    sx = (INFLUENCE_RADIUS + (INFLUENCE_RADIUS * s_player) / MAX_SPEED) / 2
+    sy = (INFLUENCE_RADIUS - (INFLUENCE_RADIUS * s_player) / MAX_SPEED) / 2
+
+    cos_dir = np.cos(dir_rad_player)
+    sin_dir = np.sin(dir_rad_player)
+
+    # Mean vector
+    diff_x = x_target - (x_player + cos_dir * s_player * 0.5)
+    diff_y = y_target - (y_player + sin_dir * s_player * 0.5)
+
+    # Rotating the difference into the player's frame makes the covariance diagonal, (sx^2, sy^2)
+    u = cos_dir * diff_x + sin_dir * diff_y
+    v = -sin_dir * diff_x + cos_dir * diff_y
+
+    # Gaussian PDF calculation
+    exponent = -0.5 * ((u / sx) ** 2 + (v / sy) ** 2)
+    norm_factor = 1 / (2 * np.pi * sx * sy)
+
+    return norm_factor * np.exp(exponent)
+
+
+@lru_cache(maxsize=8)
+def _influence_lookup_tables(speed_step: float, direction_bins: int, dtype: str) -> tuple:
+    """
+    Helper function for the terms of the influence Gaussian that only depend on the speed and direction of the
+    player, on a grid of quantized speeds and directions. In the player's frame the inverse covariance and the
+    normalization only depend on the speed and the rotation only on the direction, so the speed x direction grid is
+    stored as one small table for each axis. The tables are built once per resolution and reused.
+    :param speed_step: Width of the speed bins in yards per second
+    :param direction_bins: Number of direction bins in a full turn
+    :param dtype: Float dtype of the tables
+    :return: Tuple of the speed terms (offset of the mean along the direction, -0.5 / sx^2, -0.5 / sy^2, normalization
+    factor) and the direction terms (cos, sin), each a list of arrays
+    """
+    # Speeds stay below MAX_SPEED, where sy reaches 0 and the Gaussian degenerates
+    speeds = np.arange(int(np.ceil(MAX_SPEED / speed_step))) * speed_step
+    speeds = speeds[speeds < MAX_SPEED]
+    sx = (INFLUENCE_RADIUS + (INFLUENCE_RADIUS * speeds) / MAX_SPEED) / 2
+    sy = (INFLUENCE_RADIUS - (INFLUENCE_RADIUS * speeds) / MAX_SPEED) / 2
+    speed_terms = [speeds * 0.5, -0.5 / sx ** 2, -0.5 / sy ** 2, 1 / (2 * np.pi * sx * sy)]
+
+    directions = np.arange(direction_bins) * (2 * np.pi / direction_bins)
+    direction_terms = [np.cos(directions), np.sin(directions)]
+
+    return [terms.astype(dtype) for terms in speed_terms], [terms.astype(dtype) for terms in direction_terms]
+
+
+def _calculate_influence_lookup(x_player, y_player, s_player, dir_rad_player, x_target, y_target,
+                                speed_step: float = INFLUENCE_SPEED_STEP,
+                                direction_bins: int = INFLUENCE_DIRECTION_BINS, chunk_size: int = 32768):
+    """
+    Approximate version of _calculate_influence_vectorized. The speed and direction of every player are rounded to the
+    nearest bin of the lookup tables, so no trigonometry or division is done per row. The error against the exact
+    influence is at most influence_lookup_error_bound for speeds below the max speed it is given.
+    :param x_player: Array of player x positions
+    :param y_player: Array of player y positions
+    :param s_player: Array of player speeds
+    :param dir_rad_player: Array of player directions in radians
+    :param x_target: Array of x positions to evaluate the influence at (e.g. the football)
+    :param y_target: Array of y positions to evaluate the influence at (e.g. the football)
+    :param speed_step: Width of the speed bins in yards per second
+    :param direction_bins: Number of direction bins in a full turn
+    :param chunk_size: Number of rows evaluated at a time, small enough for the intermediate arrays to stay in cache
+    :return: Array with the approximate degree of influence of each player on each target
+    """
+    shape = np.broadcast_shapes(*[np.shape(values) for values in
+                                  [x_player, y_player, s_player, dir_rad_player, x_target, y_target]])
+    x_player, y_player, s_player, dir_rad_player, x_target, y_target = [
+        np.broadcast_to(values, shape).ravel() for values in
+        [x_player, y_player, s_player, dir_rad_player, x_target, y_target]]
+    dtype = np.result_type(x_player, np.float32)
+    (mean_offset, inverse_sx, inverse_sy, norm_factor), (cos_dir, sin_dir) = _influence_lookup_tables(
+        speed_step, direction_bins, dtype.name)
+
+    influence = np.empty(x_player.size, dtype=dtype)
+    for start in range(0, x_player.size, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        s = s_player[chunk]
+        dir_rad = dir_rad_player[chunk]
+
+        # Speeds past the last bin are clamped to it, missing values are cast to an arbitrary bin and fixed below
+        with np.errstate(invalid='ignore'):
+            speed_index = np.rint(s / speed_step).astype(np.intp)
+            direction_index = np.rint(dir_rad * (direction_bins / (2 * np.pi))).astype(np.intp) % direction_bins
+
+        # Rotate the difference into the player's frame, where the covariance is diagonal
+        diff_x = x_target[chunk] - x_player[chunk]
+        diff_y = y_target[chunk] - y_player[chunk]
+        cos_chunk = np.take(cos_dir, direction_index)
+        sin_chunk = np.take(sin_dir, direction_index)
+        u = cos_chunk * diff_x + sin_chunk * diff_y - np.take(mean_offset, speed_index, mode='clip')
+        v = cos_chunk * diff_y - sin_chunk * diff_x
+
+        exponent = u * u * np.take(inverse_sx, speed_index, mode='clip') + \
+            v * v * np.take(inverse_sy, speed_index, mode='clip')
+        values = np.take(norm_factor, speed_index, mode='clip') * np.exp(exponent)
+
+        # Missing speeds or directions have no bin, keep them missing like the exact influence
+        values[np.isnan(s) | np.isnan(dir_rad)] = np.nan
+        influence[chunk] = values
+
+    return influence.reshape(shape)
+
+
+def _influence_lookup_max_speed(speed_step: float) -> float:
+    """
+    Helper function for the fastest speed the lookup tables cover, the upper end of their last speed bin. Faster
+    players are clamped to the last bin and their error is not bounded.
+    :param speed_step: Width of the speed bins in yards per second
+    :return: Fastest covered speed in yards per second
+    """
+    last_speed = (int(np.ceil(MAX_SPEED / speed_step)) - 1) * speed_step
+    return min(last_speed + speed_step / 2, MAX_SPEED)
+
+
+def influence_lookup_error_bound(max_speed: float = 12.0, speed_step: float = INFLUENCE_SPEED_STEP,
+                                 direction_bins: int = INFLUENCE_DIRECTION_BINS) -> float:
+    """
+    Largest possible difference between the approximate and the exact influence of a player running at most max_speed,
+    anywhere on the field.
+
+    Rounding moves the speed by at most speed_step / 2 and the direction by at most pi / direction_bins, so the error
+    is at most sup|df/ds| * speed_step / 2 + sup|df/ddir| * pi / direction_bins over the bins. With N the normalization
+    factor, k = INFLUENCE_RADIUS / (2 * MAX_SPEED) and u, v the rotated difference, the influence f = N exp(-Q / 2)
+    has df/ddir = f * (v * (u + s / 2) / sy^2 - u * v / sx^2) and df/ds = f * (k / sy - k / sx + u / (2 sx^2) +
+    k u^2 / sx^3 - k v^2 / sy^3). Bounding every term with sup|t| exp(-t^2 / 2) = exp(-1/2) and
+    sup t^2 exp(-t^2 / 2) = 2 / e gives
+        |df/ddir| <= N * (sy / (e sx) + sx / (e sy) + s / (2 sy sqrt(e)))
+        |df/ds| <= N * (k / sy - k / sx + 1 / (2 sx sqrt(e)) + 2k / (e sx) + 2k / (e sy))
+    Every term is largest at one end of a speed bin, so both ends of every bin up to max_speed are checked.
+
+    With the default 0.05 yards per second and 720 direction bins the bound is about 3e-4 up to 12 yards per second,
+    while the influence itself is up to about 1e-2.
+    :param max_speed: Fastest speed to bound the error for, must be below the end of the last speed bin, just under
+    MAX_SPEED
+    :param speed_step: Width of the speed bins in yards per second
+    :param direction_bins: Number of direction bins in a full turn
+    :return: Largest absolute error of the approximate influence
+    """
+    covered_speed = _influence_lookup_max_speed(speed_step)
+    if not 0 <= max_speed < covered_speed:
+        raise ValueError(f"The error can only be bounded for speeds between 0 and {covered_speed}, not {max_speed}.")
+
+    # Both ends of every bin up to max_speed
+    centers = np.arange(int(np.rint(max_speed / speed_step)) + 1) * speed_step
+    s = np.minimum(np.concatenate([centers - speed_step / 2, centers + speed_step / 2]), max_speed)
+    s = np.maximum(s, 0)
+
+    k = INFLUENCE_RADIUS / (2 * MAX_SPEED)
+    sx = (INFLUENCE_RADIUS + (INFLUENCE_RADIUS * s) / MAX_SPEED) / 2
+    sy = (INFLUENCE_RADIUS - (INFLUENCE_RADIUS * s) / MAX_SPEED) / 2
+    norm_factor = 1 / (2 * np.pi * sx * sy)
+
+    direction_slope = norm_factor * (sy / (np.e * sx) + sx / (np.e * sy) + s / (2 * sy * np.sqrt(np.e)))
+    speed_slope = norm_factor * (k / sy - k / sx + 1 / (2 * sx * np.sqrt(np.e)) + 2 * k / (np.e * sx) +
+                                 2 * k / (np.e * sy))
+
+    return float(speed_slope.max() * speed_step / 2 + direction_slope.max() * np.pi / direction_bins)
+
+
+def _unmerge_football_columns(football_and_player_tracking: pd.DataFrame) -> pd.DataFrame:
+    """
+    Helper function to undo the suffixes of the football and player merge. Drops every column of the football side and
+    removes the _player suffix from the others, so the features can be chained on tracking that already has features.
+    :param football_and_player_tracking: Football data merged with player data
+    :return: DataFrame with the original tracking columns and the added features
+    """
+    football_columns = [column for column in football_and_player_tracking.columns if column.endswith('_football')]
+    player_columns = {column: column[:-len('_player')] for column in football_and_player_tracking.columns
+                      if column.endswith('_player')}
+
+    return football_and_player_tracking.drop(columns=football_columns).rename(columns=player_columns)
+
+
+def create_player_influence(tracking: pd.DataFrame, approximate: bool = False) -> pd.DataFrame:
     """
     Computes the degree of influence for each player on the ball carrier.
     :param tracking: DataFrame containing the tracking data.
+    :param approximate: Whether to use the lookup tables of _calculate_influence_lookup instead of the exact influence,
+    the error is at most influence_lookup_error_bound. Speeds past the last speed bin, just under MAX_SPEED, are clamped
+    to it, so there the approximate influence stays positive while the exact one degenerates and is not bounded
     :return: DataFrame with column for the degree of influence the player has on the ball
     """
+    if get_engine() == 'polars':
+        import polars_engine
+        return polars_engine.create_player_influence(tracking, approximate=approximate)
+
     tracking_copy = tracking.copy()
 
     # Filter football tracking data
@@ -97,42 +321,15 @@ def create_player_influence(tracking: pd.DataFrame) -> pd.DataFrame:
                                             on=['gameId', 'playId', 'frameId', 'time', 'playDirection'],
                                             suffixes=('_football', '_player'))
 
-    # Apply influence calculation
-    football_and_player_tracking['influence_degree'] = football_and_player_tracking.apply(_calculate_influence, axis=1)
-
-    # "Unmerge" the columns to get rid of the redundant football data
-    football_and_player_tracking = football_and_player_tracking.drop(columns=['nflId_football', 'displayName_football',
-                                                                              'jerseyNumber_football', 'club_football',
-                                                                              'x_football', 'y_football', 's_football',
-                                                                              'a_football', 'dis_football',
-                                                                              'o_football', 'dir_football',
-                                                                              'event_football', 'dir_rad_football',
-                                                                              'x_acceleration_component_football',
-                                                                              'y_acceleration_component_football',
-                                                                              'x_velocity_component_football',
-                                                                              'y_velocity_component_football'])
-
-    # Renaming columns to remove the _player suffix
-    football_and_player_tracking = football_and_player_tracking.rename(columns={
-        'nflId_player': 'nflId',
-        'displayName_player': 'displayName',
-        'jerseyNumber_player': 'jerseyNumber',
-        'club_player': 'club',
-        'x_player': 'x',
-        'y_player': 'y',
-        's_player': 's',
-        'a_player': 'a',
-        'dis_player': 'dis',
-        'o_player': 'o',
-        'dir_player': 'dir',
-        'event_player': 'event',
-        'dir_rad_player': 'dir_rad',
-        'x_acceleration_component_player': 'x_acceleration_component',
-        'y_acceleration_component_player': 'y_acceleration_component',
-        'x_velocity_component_player': 'x_velocity_component',
-        'y_velocity_component_player': 'y_velocity_component',
-        'influence_degree_player': 'influence_degree'
-    })
+    # Calculate the influence on all rows at once, a row-wise apply would return float64 whatever the precision
+    float_dtype = get_float_dtype()
+    calculate_influence = _calculate_influence_lookup if approximate else _calculate_influence_vectorized
+    football_and_player_tracking['influence_degree'] = calculate_influence(
+        *[football_and_player_tracking[column].to_numpy(dtype=float_dtype)
+          for column in ['x_player', 'y_player', 's_player', 'dir_rad_player', 'x_football', 'y_football']])
+
+    # "Unmerge" the columns to get rid of the redundant football data and remove the _player suffix
+    football_and_player_tracking = _unmerge_football_columns(football_and_player_tracking)
 
     return football_and_player_tracking
 
@@ -143,6 +340,10 @@ def create_distance_to_ball(tracking: pd.DataFrame) -> pd.DataFrame:
     :param tracking: DataFrame containing the tracking data.
     :return: DataFrame containing the tracking data with column added for the distance to the ball
     """
+    if get_engine() == 'polars':
+        import polars_engine
+        return polars_engine.create_distance_to_ball(tracking)
+
     tracking_copy = tracking.copy()
 
     football_tracking = tracking_copy.query("displayName == 'football'")
@@ -154,40 +355,11 @@ def create_distance_to_ball(tracking: pd.DataFrame) -> pd.DataFrame:
     # Calculate the distance from player to ball
     football_and_player_tracking['player_to_football_distance'] = np.sqrt(
         (football_and_player_tracking['x_player'] - football_and_player_tracking['x_football']) ** 2 + (
-                football_and_player_tracking['y_player'] - football_and_player_tracking['y_football']) ** 2)
-
-    # "Unmerge" the columns to get rid of the redundant football data
-    football_and_player_tracking = football_and_player_tracking.drop(columns=['nflId_football', 'displayName_football',
-                                                                              'jerseyNumber_football', 'club_football',
-                                                                              'x_football', 'y_football', 's_football',
-                                                                              'a_football', 'dis_football',
-                                                                              'o_football', 'dir_football',
-                                                                              'event_football', 'dir_rad_football',
-                                                                              'x_acceleration_component_football',
-                                                                              'y_acceleration_component_football',
-                                                                              'x_velocity_component_football',
-                                                                              'y_velocity_component_football'])
-
-    # Renaming columns to remove the _player suffix
-    football_and_player_tracking = football_and_player_tracking.rename(columns={
-        'nflId_player': 'nflId',
-        'displayName_player': 'displayName',
-        'jerseyNumber_player': 'jerseyNumber',
-        'club_player': 'club',
-        'x_player': 'x',
-        'y_player': 'y',
-        's_player': 's',
-        'a_player': 'a',
-        'dis_player': 'dis',
-        'o_player': 'o',
-        'dir_player': 'dir',
-        'event_player': 'event',
-        'dir_rad_player': 'dir_rad',
-        'x_acceleration_component_player': 'x_acceleration_component',
-        'y_acceleration_component_player': 'y_acceleration_component',
-        'x_velocity_component_player': 'x_velocity_component',
-        'y_velocity_component_player': 'y_velocity_component'
-    })
+                football_and_player_tracking['y_player'] - football_and_player_tracking['y_football']) ** 2).astype(
+        get_float_dtype())
+
+    # "Unmerge" the columns to get rid of the redundant football data and remove the _player suffix
+    football_and_player_tracking = _unmerge_football_columns(football_and_player_tracking)
 
     return football_and_player_tracking
 
@@ -234,3 +406,629 @@ def all_plays_left_to_right(plays: pd.DataFrame, tracking: pd.DataFrame) -> tupl
     plays_copy = plays_copy.rename(columns={'yardline_after_switching_direction': 'absoluteYardlineNumber'})
 
     return plays_copy, tracking_copy
+
+
+def _track_boundaries(keys: list) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Helper function to find the first and last position of the group each row belongs to. The key arrays must already
+    be sorted so that every group is contiguous.
+    :param keys: List of sorted arrays that together identify a group
+    :return: Arrays with the index of the first and last row of the group for every row
+    """
+    n = len(keys[0])
+    new_group = np.zeros(n, dtype=bool)
+    if n > 0:
+        new_group[0] = True
+    for key in keys:
+        new_group[1:] |= key[1:] != key[:-1]
+
+    group_starts = np.flatnonzero(new_group)
+    group_ends = np.append(group_starts[1:] - 1, n - 1)
+    group_sizes = group_ends - group_starts + 1
+
+    return np.repeat(group_starts, group_sizes), np.repeat(group_ends, group_sizes)
+
+
+def _grouped_moving_average(values: np.ndarray, starts: np.ndarray, ends: np.ndarray, window: int) -> np.ndarray:
+    """
+    Helper function for a centered moving average that does not cross group boundaries. The window shrinks
+    symmetrically near the start and end of each group so straight lines are not bent at the ends.
+    :param values: Values sorted by group
+    :param starts: Index of the first row of the group for every row
+    :param ends: Index of the last row of the group for every row
+    :param window: Number of rows in the window, rounded up to an odd number
+    :return: Smoothed values, missing values are skipped and windows without any value are NaN
+    """
+    index = np.arange(len(values))
+    half_window = np.minimum(np.minimum(window // 2, index - starts), ends - index)
+    low = index - half_window
+    high = index + half_window
+
+    # Window sums from the running total. The running total over a whole season is large, so it is always kept in
+    # float64 to avoid cancellation, and the averages are returned in the input precision. NaNs are left out of the
+    # running total and counted separately so a missing value only affects its own windows.
+    cumulative = np.concatenate(([0.0], np.nancumsum(values, dtype='float64')))
+    valid = np.concatenate(([0], np.cumsum(~np.isnan(values))))
+    counts = valid[high + 1] - valid[low]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        averages = np.where(counts > 0, (cumulative[high + 1] - cumulative[low]) / counts, np.nan)
+    return averages.astype(values.dtype)
+
+
+def _grouped_gradient(values: np.ndarray, times: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Helper function for the derivative of values with respect to time that does not cross group boundaries. Uses
+    central differences inside the group and one-sided differences at its first and last row.
+    :param values: Values sorted by group
+    :param times: Time in seconds of every value
+    :param starts: Index of the first row of the group for every row
+    :param ends: Index of the last row of the group for every row
+    :return: Derivative of the values, NaN for groups with a single row
+    """
+    index = np.arange(len(values))
+    previous = np.maximum(index - 1, starts)
+    following = np.minimum(index + 1, ends)
+
+    elapsed = times[following] - times[previous]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gradient = (values[following] - values[previous]) / elapsed
+    gradient[elapsed == 0] = np.nan
+
+    return gradient
+
+
+def create_derived_kinematics(tracking: pd.DataFrame, window: int = 5) -> pd.DataFrame:
+    """
+    Re-derives the kinematics of every player and the football from the (x,y) positions instead of trusting the
+    s, a, dir and dis columns. Positions are smoothed with a centered moving average within each
+    (gameId, playId, nflId) track, then velocity, acceleration and jerk are taken with finite differences over the
+    frameId time, or the time_since_reference of resampled tracking. All tracks are processed at once on the sorted arrays.
+    :param tracking: DataFrame containing the tracking data.
+    :param window: Number of frames in the smoothing window, 1 turns smoothing off
+    :return: DataFrame containing the tracking data with the smoothed positions and the derived velocity,
+    acceleration and jerk added
+    """
+    tracking_copy = tracking.copy()
+
+    # The football has no nflId, give it a placeholder so it forms its own track
+    nfl_ids = tracking_copy['nflId'].fillna(-1).to_numpy()
+    game_ids = tracking_copy['gameId'].to_numpy()
+    play_ids = tracking_copy['playId'].to_numpy()
+    frame_ids = tracking_copy['frameId'].to_numpy()
+
+    # Sort so that each track is contiguous and in time order
+    order = np.lexsort((frame_ids, nfl_ids, play_ids, game_ids))
+    starts, ends = _track_boundaries([game_ids[order], play_ids[order], nfl_ids[order]])
+
+    # Tracking is recorded at 10 frames per second, using the frameId keeps dropped frames spaced correctly. Resampled
+    # tracking carries the time of its grid instead.
+    float_dtype = get_float_dtype()
+    if 'time_since_reference' in tracking_copy:
+        times = tracking_copy['time_since_reference'].to_numpy(dtype=float_dtype)[order]
+    else:
+        times = frame_ids[order].astype(float_dtype) * 0.1
+
+    x_smoothed = _grouped_moving_average(tracking_copy['x'].to_numpy(dtype=float_dtype)[order], starts, ends, window)
+    y_smoothed = _grouped_moving_average(tracking_copy['y'].to_numpy(dtype=float_dtype)[order], starts, ends, window)
+
+    x_velocity = _grouped_gradient(x_smoothed, times, starts, ends)
+    y_velocity = _grouped_gradient(y_smoothed, times, starts, ends)
+    x_acceleration = _grouped_gradient(x_velocity, times, starts, ends)
+    y_acceleration = _grouped_gradient(y_velocity, times, starts, ends)
+    x_jerk = _grouped_gradient(x_acceleration, times, starts, ends)
+    y_jerk = _grouped_gradient(y_acceleration, times, starts, ends)
+
+    derived = {
+        'x_smoothed': x_smoothed,
+        'y_smoothed': y_smoothed,
+        'derived_x_velocity': x_velocity,
+        'derived_y_velocity': y_velocity,
+        'derived_s': np.hypot(x_velocity, y_velocity),
+        # Same convention as the dir column, degrees clockwise from the y-axis
+        'derived_dir': np.degrees(np.arctan2(x_velocity, y_velocity)) % 360,
+        'derived_x_acceleration': x_acceleration,
+        'derived_y_acceleration': y_acceleration,
+        'derived_a': np.hypot(x_acceleration, y_acceleration),
+        'derived_x_jerk': x_jerk,
+        'derived_y_jerk': y_jerk,
+        'derived_jerk': np.hypot(x_jerk, y_jerk)
+    }
+
+    # Put the values back in the original row order
+    for column, values in derived.items():
+        unsorted = np.empty_like(values)
+        unsorted[order] = values
+        tracking_copy[column] = unsorted
+
+    return tracking_copy
+
+
+def create_event_index(tracking: pd.DataFrame, events: list = None) -> pd.DataFrame:
+    """
+    Records the frameId of the key events of every play in a single pass over the tracking data.
+    :param tracking: DataFrame containing the tracking data.
+    :param events: Events to index. Defaults to KEY_EVENTS
+    :return: DataFrame indexed by (gameId, playId) with one column per event containing the first frameId the event
+    occurs in, missing if the event never occurs in the play
+    """
+    if events is None:
+        events = KEY_EVENTS
+
+    play_index = pd.MultiIndex.from_frame(tracking[['gameId', 'playId']].drop_duplicates())
+
+    event_rows = tracking.loc[tracking['event'].isin(events), ['gameId', 'playId', 'event', 'frameId']]
+
+    # The event is repeated on the row of every player in the frame, the first frame is the one that matters
+    event_index = (event_rows.groupby(['gameId', 'playId', 'event'])['frameId'].min()
+                   .unstack('event')
+                   .reindex(index=play_index, columns=events)
+                   .astype('Int32'))
+    event_index.columns.name = None
+
+    return event_index
+
+
+def crop_to_event_window(tracking: pd.DataFrame, event_index: pd.DataFrame = None,
+                         start_events: tuple = ('ball_snap',),
+                         end_events: tuple = ('tackle', 'out_of_bounds', 'touchdown'),
+                         frames_before: int = 0, frames_after: int = 0,
+                         drop_incomplete: bool = False) -> pd.DataFrame:
+    """
+    Trims the tracking data of every play to the frames between a start and end event. Run this before
+    create_player_influence and the other features so that they do not pay for pre-snap and post-whistle frames.
+    :param tracking: DataFrame containing the tracking data.
+    :param event_index: Output of create_event_index, created from the tracking data if not provided
+    :param start_events: Events that start the window, the earliest one in the play is used
+    :param end_events: Events that end the window, the earliest one in the play is used
+    :param frames_before: Number of frames to keep before the start event
+    :param frames_after: Number of frames to keep after the end event
+    :param drop_incomplete: If True plays without a start or end event are removed, otherwise they are not trimmed on
+    the side that is missing
+    :return: DataFrame containing only the tracking data inside the event window of each play
+    """
+    if event_index is None:
+        event_index = create_event_index(tracking, list(start_events) + list(end_events))
+
+    window = pd.DataFrame(index=event_index.index)
+    window['start'] = event_index[list(start_events)].min(axis=1) - frames_before
+    window['end'] = event_index[list(end_events)].min(axis=1) + frames_after
+
+    # Look up the window of each row by its play instead of merging the window onto the tracking data
+    row_window = window.reindex(pd.MultiIndex.from_frame(tracking[['gameId', 'playId']]))
+    start = row_window['start'].to_numpy(dtype=float)
+    end = row_window['end'].to_numpy(dtype=float)
+
+    if drop_incomplete:
+        keep = (tracking['frameId'].to_numpy() >= start) & (tracking['frameId'].to_numpy() <= end)
+    else:
+        keep = (tracking['frameId'].to_numpy() >= np.nan_to_num(start, nan=-np.inf)) & \
+               (tracking['frameId'].to_numpy() <= np.nan_to_num(end, nan=np.inf))
+
+    cropped = tracking[keep]
+    print("Cropped the tracking data to the event window, keeping " + str(len(cropped)) + " of " +
+          str(len(tracking)) + " rows.")
+
+    return cropped
+
+
+def create_play_influence_summary(tracking: pd.DataFrame, tackles: pd.DataFrame, radius: float = INFLUENCE_RADIUS,
+                                  frame_interval: float = 0.1) -> pd.DataFrame:
+    """
+    Summarizes the influence and proximity to the ball of every player in every play, labeled with the tackles data.
+    The tracking must already have the influence_degree and player_to_football_distance columns from
+    create_player_influence and create_distance_to_ball.
+    :param tracking: DataFrame containing the tracking data with the influence and distance features
+    :param tackles: DataFrame containing the tackles data
+    :param radius: Distance in yards to the ball that counts as being near the ball
+    :param frame_interval: Seconds between frames, 0.1 for the raw tracking and 1 / frequency for the output of
+    resample_tracking, whose time_since_reference column is used for the time of first entry
+    :return: DataFrame with one row per (gameId, playId, nflId) containing the max, mean and integral of influence,
+    the minimum distance to the ball, the frames spent within the radius, the time of first entry into the radius and
+    the tackle labels
+    """
+    # The football has no nflId and is left out of the summary
+    players = tracking.loc[tracking['nflId'].notnull(), ['gameId', 'playId', 'nflId', 'frameId', 'influence_degree',
+                                                         'player_to_football_distance']]
+    players = players.sort_values(['gameId', 'playId', 'nflId', 'frameId'])
+
+    # Resampled tracking carries the time of its grid, otherwise the frames are frame_interval apart
+    if 'time_since_reference' in tracking:
+        seconds = tracking.loc[players.index, 'time_since_reference'].astype('float64')
+    else:
+        seconds = players['frameId'] * frame_interval
+
+    within_radius = players['player_to_football_distance'] <= radius
+    players = players.assign(within_radius=within_radius, seconds=seconds, entry_seconds=seconds.where(within_radius))
+
+    summary = players.groupby(['gameId', 'playId', 'nflId'], sort=False).agg(
+        max_influence=('influence_degree', 'max'),
+        mean_influence=('influence_degree', 'mean'),
+        influence_integral=('influence_degree', 'sum'),
+        min_distance_to_ball=('player_to_football_distance', 'min'),
+        frames_within_radius=('within_radius', 'sum'),
+        first_seconds=('seconds', 'min'),
+        first_entry_seconds=('entry_seconds', 'min')
+    ).reset_index()
+
+    summary['influence_integral'] = summary['influence_integral'] * frame_interval
+    summary['time_of_first_entry'] = summary['first_entry_seconds'] - summary['first_seconds']
+    summary = summary.drop(columns=['first_seconds', 'first_entry_seconds'])
+    float_columns = ['max_influence', 'mean_influence', 'influence_integral', 'min_distance_to_ball',
+                     'time_of_first_entry']
+    summary[float_columns] = summary[float_columns].astype(get_float_dtype())
+    summary['nflId'] = summary['nflId'].astype('int32')
+    summary['frames_within_radius'] = summary['frames_within_radius'].astype('int32')
+
+    # Label the players with the tackles data, players without a tackle record did not make one
+    tackle_columns = ['tackle', 'assist', 'forcedFumble', 'pff_missedTackle']
+    summary = pd.merge(summary, tackles[['gameId', 'playId', 'nflId'] + tackle_columns],
+                       on=['gameId', 'playId', 'nflId'], how='left')
+    summary[tackle_columns] = summary[tackle_columns].fillna(0).astype('int32')
+
+    return summary
+
+
+def update_play_influence_summary(summary: pd.DataFrame, tracking: pd.DataFrame, tackles: pd.DataFrame,
+                                  radius: float = INFLUENCE_RADIUS, frame_interval: float = 0.1) -> pd.DataFrame:
+    """
+    Refreshes an existing play summary with new tracking data, e.g. when a new week arrives. Only the plays in the new
+    tracking data are computed, and they replace any rows the summary already has for those plays.
+    :param summary: Existing output of create_play_influence_summary
+    :param tracking: DataFrame containing the new tracking data with the influence and distance features
+    :param tackles: DataFrame containing the tackles data
+    :param radius: Distance in yards to the ball that counts as being near the ball
+    :param frame_interval: Seconds between frames, see create_play_influence_summary
+    :return: DataFrame with the updated summary
+    """
+    new_summary = create_play_influence_summary(tracking, tackles, radius, frame_interval)
+
+    new_plays = pd.MultiIndex.from_frame(new_summary[['gameId', 'playId']].drop_duplicates())
+    old_plays = pd.MultiIndex.from_frame(summary[['gameId', 'playId']])
+    summary = summary[~old_plays.isin(new_plays)]
+
+    return pd.concat([summary, new_summary], ignore_index=True).sort_values(
+        ['gameId', 'playId', 'nflId'], ignore_index=True)
+
+
+def _influence_cutoff(s_player: np.ndarray, error_bound: float) -> np.ndarray:
+    """
+    Helper function for the distance from the center of a player's influence beyond which the influence is below the
+    error bound. The influence is a Gaussian whose widest standard deviation is sx, so at a distance r from its mean it
+    is at most norm_factor * exp(-r^2 / (2 * sx^2)).
+    :param s_player: Array of player speeds
+    :param error_bound: Largest influence that may be skipped
+    :return: Array with the cutoff distance of each player
+    """
+    sx = (INFLUENCE_RADIUS + (INFLUENCE_RADIUS * s_player) / MAX_SPEED) / 2
+    sy = (INFLUENCE_RADIUS - (INFLUENCE_RADIUS * s_player) / MAX_SPEED) / 2
+    norm_factor = 1 / (2 * np.pi * sx * sy)
+
+    return sx * np.sqrt(2 * np.log(np.maximum(norm_factor / error_bound, 1)))
+
+
+def create_influence_field(tracking: pd.DataFrame, points: np.ndarray = None, grid_resolution: float = 1.0,
+                           error_bound: float = 1e-6) -> pd.DataFrame:
+    """
+    Computes the total influence of each club at points across the field for every frame. The points are bucketed in a
+    uniform grid of INFLUENCE_CELL_SIZE cells, so each player is only evaluated against the points in the cells their
+    own cutoff circle reaches instead of every point on the field. A player's influence at a skipped point is below
+    error_bound, so a club's total at any point is off by at most error_bound times the number of players in the club.
+    :param tracking: DataFrame containing the tracking data with the dir_rad column. Every frame in it is evaluated, so
+    pass a play or a few plays at a time
+    :param points: Array of shape (n, 2) with the (x,y) points to evaluate, defaults to a grid over the field
+    :param grid_resolution: Spacing in yards of the default grid of points
+    :param error_bound: Largest influence of a single player that may be skipped, 0 evaluates every pair
+    :return: DataFrame with the gameId, playId, frameId, club, point (x,y) and influence of every club at every point
+    it has influence on
+    """
+    if points is None:
+        grid_x, grid_y = np.meshgrid(np.arange(0, 120 + grid_resolution, grid_resolution),
+                                     np.arange(0, 53.3 + grid_resolution, grid_resolution), indexing='ij')
+        points = np.column_stack([grid_x.ravel(), grid_y.ravel()])
+    float_dtype = get_float_dtype()
+    points = np.asarray(points, dtype=float_dtype)
+
+    # The football does not have influence
+    players = tracking.query("displayName != 'football'")
+    x = players['x'].to_numpy(dtype=float_dtype)
+    y = players['y'].to_numpy(dtype=float_dtype)
+    s = players['s'].to_numpy(dtype=float_dtype)
+    dir_rad = players['dir_rad'].to_numpy(dtype=float_dtype)
+
+    if error_bound > 0:
+        # Center of each player's influence, same as the mean vector in _calculate_influence
+        mean_x = x + np.cos(dir_rad) * s * 0.5
+        mean_y = y + np.sin(dir_rad) * s * 0.5
+        cutoff = _influence_cutoff(s, error_bound).astype('float64')
+        cell_size = max(INFLUENCE_CELL_SIZE, grid_resolution)
+
+        # Bucket the points into the grid, sorted by cell with the bounds of the points of each cell
+        origin_x, origin_y = points[:, 0].min(), points[:, 1].min()
+        point_cell_x = ((points[:, 0] - origin_x) // cell_size).astype(int)
+        point_cell_y = ((points[:, 1] - origin_y) // cell_size).astype(int)
+        cells_x, cells_y = point_cell_x.max() + 1, point_cell_y.max() + 1
+        point_cells = point_cell_x * cells_y + point_cell_y
+        point_order = np.argsort(point_cells, kind='stable')
+        cell_bounds = np.concatenate(([0], np.cumsum(np.bincount(point_cells, minlength=cells_x * cells_y))))
+
+        # Columns of cells that each player's cutoff circle reaches, players without a position or speed reach none
+        valid = np.isfinite(mean_x) & np.isfinite(mean_y) & np.isfinite(cutoff)
+        mean_x, mean_y, cutoff = np.where(valid, mean_x, 0), np.where(valid, mean_y, 0), np.where(valid, cutoff, -1)
+        low_x = np.maximum(np.floor((mean_x - cutoff - origin_x) / cell_size), 0).astype(int)
+        high_x = np.minimum(np.floor((mean_x + cutoff - origin_x) / cell_size), cells_x - 1).astype(int)
+        columns_per_player = np.maximum(high_x - low_x + 1, 0)
+        column_player = np.repeat(np.arange(len(players)), columns_per_player)
+        column_x = low_x[column_player] + np.arange(columns_per_player.sum()) - \
+            np.repeat(np.cumsum(columns_per_player) - columns_per_player, columns_per_player)
+
+        # The cells of a column the circle reaches are contiguous, and so are their points since the points are
+        # sorted by cell. The circle is widest in the column at the x closest to its center.
+        column_left = origin_x + column_x * cell_size
+        nearest_x = np.clip(mean_x[column_player], column_left, column_left + cell_size)
+        half_height = np.sqrt(np.maximum(cutoff[column_player] ** 2 - (nearest_x - mean_x[column_player]) ** 2, 0))
+        low_y = np.maximum(np.floor((mean_y[column_player] - half_height - origin_y) / cell_size), 0).astype(int)
+        high_y = np.minimum(np.floor((mean_y[column_player] + half_height - origin_y) / cell_size),
+                            cells_y - 1).astype(int)
+        reached = high_y >= low_y
+        pair_players = column_player[reached]
+        pair_starts = cell_bounds[column_x[reached] * cells_y + low_y[reached]]
+        pair_counts = cell_bounds[column_x[reached] * cells_y + high_y[reached] + 1] - pair_starts
+
+        # Expand each (player, column) into one pair per point in its reached cells
+        position_in_cell = np.arange(pair_counts.sum()) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+        player_index = np.repeat(pair_players, pair_counts)
+        point_index = point_order[np.repeat(pair_starts, pair_counts) + position_in_cell]
+
+        # Only keep the pairs within the player's own cutoff
+        within_cutoff = np.hypot(points[point_index, 0] - mean_x[player_index],
+                                 points[point_index, 1] - mean_y[player_index]) <= cutoff[player_index]
+        player_index = player_index[within_cutoff]
+        point_index = point_index[within_cutoff]
+    else:
+        player_index = np.repeat(np.arange(len(players)), len(points))
+        point_index = np.tile(np.arange(len(points)), len(players))
+
+    influence = _calculate_influence_vectorized(x[player_index], y[player_index], s[player_index],
+                                                dir_rad[player_index], points[point_index, 0],
+                                                points[point_index, 1])
+
+    pairs = pd.DataFrame({
+        'gameId': players['gameId'].to_numpy()[player_index],
+        'playId': players['playId'].to_numpy()[player_index],
+        'frameId': players['frameId'].to_numpy()[player_index],
+        'club': players['club'].to_numpy()[player_index],
+        'point': point_index,
+        'influence': influence
+    })
+    field = pairs.groupby(['gameId', 'playId', 'frameId', 'club', 'point'], sort=True)['influence'].sum()
+    field = field.reset_index()
+
+    field.insert(5, 'x', points[field['point'].to_numpy(), 0])
+    field.insert(6, 'y', points[field['point'].to_numpy(), 1])
+
+    return field
+
+
+def resample_tracking(tracking: pd.DataFrame, frequency: float = 5.0,
+                      reference_event: str = 'ball_snap') -> pd.DataFrame:
+    """
+    Resamples every (gameId, playId, nflId) track onto a uniform time grid, e.g. down to 5 Hz for cheaper influence
+    and grid computations, or at 10 Hz to remove the jitter and dropped frames of the time column. The grid is aligned
+    to the reference event of each play so every track in a play shares the same grid times. Positions, speed and
+    acceleration are interpolated linearly and angles along the shortest arc, all tracks at once on the sorted arrays.
+    :param tracking: DataFrame containing the tracking data.
+    :param frequency: Frequency of the grid in Hz
+    :param reference_event: Event the grid is aligned to, plays without it are aligned to their first frame. None
+    aligns every play to its first frame
+    :return: DataFrame containing the resampled tracking data with renumbered frameIds and a time_since_reference
+    column in seconds
+    """
+    times = pd.to_datetime(tracking['time'])
+    play_keys = pd.MultiIndex.from_frame(tracking[['gameId', 'playId']])
+
+    # Reference time of every play, looked up by index for every row
+    reference = times.groupby([tracking['gameId'], tracking['playId']]).min()
+    if reference_event is not None:
+        event_times = times[(tracking['event'] == reference_event).to_numpy()]
+        event_reference = event_times.groupby([tracking['gameId'], tracking['playId']]).min()
+        reference = event_reference.reindex(reference.index).fillna(reference)
+    row_reference = reference.reindex(play_keys).to_numpy()
+    seconds = (times.to_numpy() - row_reference) / np.timedelta64(1, 's')
+
+    # Sort so that each track is contiguous and in time order
+    game_ids = tracking['gameId'].to_numpy()
+    play_ids = tracking['playId'].to_numpy()
+    nfl_ids = tracking['nflId'].fillna(-1).to_numpy()
+    order = np.lexsort((seconds, nfl_ids, play_ids, game_ids))
+    seconds = seconds[order]
+    starts, ends = _track_boundaries([game_ids[order], play_ids[order], nfl_ids[order]])
+    track_starts = np.unique(starts)
+    track_ends = ends[track_starts]
+
+    # Grid steps that fall inside each track. The times jitter by a microsecond (e.g. 38.099999), so a tolerance of a
+    # millisecond keeps the first and last frames that are only off the grid by jitter.
+    first_step = np.ceil((seconds[track_starts] - 1e-3) * frequency).astype(np.int64)
+    last_step = np.floor((seconds[track_ends] + 1e-3) * frequency).astype(np.int64)
+    steps_per_track = np.maximum(last_step - first_step + 1, 0)
+
+    grid_track = np.repeat(np.arange(len(track_starts)), steps_per_track)
+    grid_step = first_step[grid_track] + np.arange(steps_per_track.sum()) - \
+        np.repeat(np.cumsum(steps_per_track) - steps_per_track, steps_per_track)
+    grid_seconds = grid_step / frequency
+
+    # Find the rows on either side of every grid time with a single search over all tracks. Tracks are placed one
+    # after the other on a single time line so the search never crosses into the next track.
+    span = np.ceil(np.nanmax(np.abs(seconds), initial=0)) * 2 + 10
+    track_of_row = np.repeat(np.arange(len(track_starts)), track_ends - track_starts + 1)
+    right = np.searchsorted(track_of_row * span + seconds, grid_track * span + grid_seconds, side='left')
+    right = np.clip(right, track_starts[grid_track], track_ends[grid_track])
+    left = np.maximum(right - 1, track_starts[grid_track])
+    elapsed = seconds[right] - seconds[left]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(elapsed > 0, (grid_seconds - seconds[left]) / elapsed, 0.0)
+    weight = np.clip(weight, 0, 1)
+
+    float_dtype = get_float_dtype()
+    sorted_tracking = tracking.iloc[order]
+    resampled = sorted_tracking.iloc[left].reset_index(drop=True)
+
+    def interpolate(column):
+        values = sorted_tracking[column].to_numpy(dtype='float64')
+        return (values[left] + weight * (values[right] - values[left])).astype(float_dtype)
+
+    def interpolate_angle(column):
+        radians = np.radians(sorted_tracking[column].to_numpy(dtype='float64'))
+        sin = np.sin(radians[left]) + weight * (np.sin(radians[right]) - np.sin(radians[left]))
+        cos = np.cos(radians[left]) + weight * (np.cos(radians[right]) - np.cos(radians[left]))
+        return (np.degrees(np.arctan2(sin, cos)) % 360).astype(float_dtype)
+
+    for column in ['x', 'y', 's', 'a']:
+        resampled[column] = interpolate(column)
+    for column in ['o', 'dir']:
+        resampled[column] = interpolate_angle(column)
+
+    # The distance travelled depends on the frame rate, so it is recomputed between grid points
+    distance = np.hypot(np.diff(resampled['x'].to_numpy(dtype='float64'), prepend=np.nan),
+                        np.diff(resampled['y'].to_numpy(dtype='float64'), prepend=np.nan))
+    new_track = np.ones(len(resampled), dtype=bool)
+    new_track[1:] = grid_track[1:] != grid_track[:-1]
+    resampled['dis'] = np.where(new_track, 0, distance).astype(float_dtype)
+
+    # Events are moved to the nearest grid time of their track
+    events = np.full(len(resampled), np.nan, dtype=object)
+    event_rows = np.flatnonzero(sorted_tracking['event'].notnull().to_numpy())
+    if len(event_rows) > 0:
+        event_tracks = track_of_row[event_rows]
+        event_steps = np.round(seconds[event_rows] * frequency).astype(np.int64)
+        event_steps = np.clip(event_steps, first_step[event_tracks], last_step[event_tracks])
+        grid_offsets = np.cumsum(steps_per_track) - steps_per_track
+        has_grid = steps_per_track[event_tracks] > 0
+        event_positions = grid_offsets[event_tracks] + event_steps - first_step[event_tracks]
+        events[event_positions[has_grid]] = sorted_tracking['event'].to_numpy()[event_rows][has_grid]
+    resampled['event'] = events
+
+    resampled['time_since_reference'] = grid_seconds.astype(float_dtype)
+    resampled['time'] = reference.reindex(pd.MultiIndex.from_frame(resampled[['gameId', 'playId']])).to_numpy() + \
+        pd.to_timedelta(grid_seconds, unit='s')
+
+    # Renumber the frames of every play from 1 on the new grid
+    play_first_step = pd.Series(grid_step).groupby([resampled['gameId'], resampled['playId']]).transform('min')
+    resampled['frameId'] = (grid_step - play_first_step.to_numpy() + 1).astype('int32')
+
+    return resampled
+
+
+def create_ball_carrier_frame(tracking: pd.DataFrame, plays: pd.DataFrame) -> pd.DataFrame:
+    """
+    Expresses every player's position, velocity and orientation relative to the ball carrier, in the carrier's moving
+    frame: forward is the carrier's direction of travel and lateral is to the carrier's right. The carrier's track is
+    looked up by index for every row instead of merging it onto the tracking data. Rows of plays without a ball carrier
+    and frames the carrier is missing from are left missing.
+    :param tracking: DataFrame containing the tracking data.
+    :param plays: DataFrame containing the plays data with the ballCarrierId
+    :return: DataFrame containing the tracking data with the carrier_forward, carrier_lateral, carrier_distance,
+    carrier_forward_velocity, carrier_lateral_velocity, carrier_relative_dir and carrier_relative_o columns added
+    """
+    tracking_copy = tracking.copy()
+
+    # The ball carrier of every row, looked up by its play
+    ball_carriers = plays.drop_duplicates(['gameId', 'playId']).set_index(['gameId', 'playId'])['ballCarrierId']
+    row_carrier = ball_carriers.reindex(pd.MultiIndex.from_frame(tracking_copy[['gameId', 'playId']])).to_numpy()
+
+    # The carrier's track indexed by frame, then broadcast to every row of the same frame
+    frame_keys = ['gameId', 'playId', 'frameId']
+    carrier_track = (tracking_copy.loc[tracking_copy['nflId'].to_numpy() == row_carrier, frame_keys + ['x', 'y', 's',
+                                                                                                     'dir']]
+                     .drop_duplicates(frame_keys)
+                     .set_index(frame_keys)
+                     .reindex(pd.MultiIndex.from_frame(tracking_copy[frame_keys])))
+
+    x, y, s, direction = [tracking_copy[column].to_numpy(dtype='float64') for column in ['x', 'y', 's', 'dir']]
+    carrier_x, carrier_y, carrier_s, carrier_dir = [carrier_track[column].to_numpy(dtype='float64')
+                                                    for column in ['x', 'y', 's', 'dir']]
+
+    # Unit vectors of the carrier's frame, directions are measured clockwise from the y-axis
+    carrier_dir_rad = np.radians(carrier_dir)
+    forward_x, forward_y = np.sin(carrier_dir_rad), np.cos(carrier_dir_rad)
+    right_x, right_y = forward_y, -forward_x
+
+    # Translate to the carrier, then rotate onto the carrier's axes
+    diff_x = x - carrier_x
+    diff_y = y - carrier_y
+
+    # Velocity relative to the carrier's own velocity
+    dir_rad = np.radians(direction)
+    velocity_x = s * np.sin(dir_rad) - carrier_s * forward_x
+    velocity_y = s * np.cos(dir_rad) - carrier_s * forward_y
+
+    float_dtype = get_float_dtype()
+    tracking_copy['carrier_forward'] = (diff_x * forward_x + diff_y * forward_y).astype(float_dtype)
+    tracking_copy['carrier_lateral'] = (diff_x * right_x + diff_y * right_y).astype(float_dtype)
+    tracking_copy['carrier_distance'] = np.hypot(diff_x, diff_y).astype(float_dtype)
+    tracking_copy['carrier_forward_velocity'] = (velocity_x * forward_x + velocity_y * forward_y).astype(float_dtype)
+    tracking_copy['carrier_lateral_velocity'] = (velocity_x * right_x + velocity_y * right_y).astype(float_dtype)
+    tracking_copy['carrier_relative_dir'] = ((direction - carrier_dir) % 360).astype(float_dtype)
+    tracking_copy['carrier_relative_o'] = ((tracking_copy['o'].to_numpy(dtype='float64') - carrier_dir) % 360).astype(
+        float_dtype)
+
+    return tracking_copy
+
+
+def benchmark_influence(tracking_path: str, repeats: int = 3) -> pd.DataFrame:
+    """
+    Benchmarks the exact and the approximate influence on a tracking CSV, e.g. a full week. Only the influence of every
+    player on the football is timed, the football merge that both share is done once beforehand. The error is only
+    measured on the players inside the speeds the lookup tables cover, the football and faster rows are counted
+    separately since the error is not bounded for them.
+    :param tracking_path: Path to a tracking CSV
+    :param repeats: Number of times to run each version, the fastest is kept
+    :return: DataFrame with the time of both versions for each precision, the speedup of the approximate influence,
+    the number of rows compared and left out, the largest error measured and the error bound for the fastest speed
+    compared
+    """
+    from cleaning import clean_tracking_data
+
+    tracking = create_velocity_vectors(clean_tracking_data(pd.read_csv(tracking_path)))
+    football_tracking = tracking.query("displayName == 'football'")
+    football_and_player_tracking = pd.merge(football_tracking, tracking,
+                                            on=['gameId', 'playId', 'frameId', 'time', 'playDirection'],
+                                            suffixes=('_football', '_player'))
+
+    results = []
+    for float_dtype in ['float32', 'float64']:
+        columns = [football_and_player_tracking[column].to_numpy(dtype=float_dtype)
+                   for column in ['x_player', 'y_player', 's_player', 'dir_rad_player', 'x_football', 'y_football']]
+
+        timings = {}
+        for name, calculate_influence in [('exact', _calculate_influence_vectorized),
+                                          ('approximate', _calculate_influence_lookup)]:
+            best = float('inf')
+            for _ in range(repeats):
+                start = time.perf_counter()
+                influence = calculate_influence(*columns)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = (best, influence)
+
+        # The football is not a player and can be faster than MAX_SPEED, neither has a bounded error
+        compared = (football_and_player_tracking['displayName_player'] != 'football').to_numpy() & \
+            (columns[2] < _influence_lookup_max_speed(INFLUENCE_SPEED_STEP))
+        error = np.abs(timings['exact'][1] - timings['approximate'][1])[compared]
+        max_speed = float(np.nanmax(columns[2][compared], initial=0))
+        results.append({'precision': float_dtype, 'rows': len(football_and_player_tracking),
+                        'compared_rows': int(compared.sum()), 'excluded_rows': int((~compared).sum()),
+                        'exact_seconds': timings['exact'][0], 'approximate_seconds': timings['approximate'][0],
+                        'max_error': float(np.nanmax(error, initial=0)),
+                        'error_bound': influence_lookup_error_bound(max_speed)})
+
+    results = pd.DataFrame(results)
+    results['speedup'] = results['exact_seconds'] / results['approximate_seconds']
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the exact and approximate influence on a tracking CSV.')
+    parser.add_argument('tracking_path', help='Path to a tracking CSV, e.g. a full week')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per version, the fastest is kept')
+    args = parser.parse_args()
+
+    print(benchmark_influence(args.tracking_path, args.repeats).to_string(index=False))
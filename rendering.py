@@ -0,0 +1,253 @@
+"""
+File: rendering.py
+Headless raster rendering of plays, an alternative to the interactive plotly animation in visualizations.py
+
+Draws the same field, the players colored from constants.nfl_teams_colors and the velocity and acceleration vectors
+into PNG frame sequences or animated GIF/MP4 files without a display. The static field is drawn once into an image,
+and every frame is drawn on top of that image in a pool of worker processes.
+
+Requires matplotlib, and ffmpeg on the path for MP4 files.
+"""
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from constants import nfl_teams_colors
+
+FIELD_LENGTH = 120
+FIELD_WIDTH = 53.3
+
+# Size of the rendered images
+DEFAULT_WIDTH_INCHES = 12
+DEFAULT_DPI = 80
+
+
+def _new_figure(width_inches: float, dpi: int):
+    """
+    Helper function to create a figure and axes covering the field. The Agg canvas is used directly instead of pyplot
+    so no display is needed and figures are not shared between threads.
+    :param width_inches: Width of the image in inches
+    :param dpi: Dots per inch of the image
+    :return: Tuple of the figure, axes and canvas
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(width_inches, width_inches * FIELD_WIDTH / FIELD_LENGTH), dpi=dpi)
+    canvas = FigureCanvasAgg(figure)
+    axes = figure.add_axes((0, 0, 1, 1))
+    axes.set_xlim(0, FIELD_LENGTH)
+    axes.set_ylim(0, FIELD_WIDTH)
+    axes.axis('off')
+    return figure, axes, canvas
+
+
+def _figure_to_array(canvas) -> np.ndarray:
+    """
+    Helper function to draw a figure into an RGB array
+    :param canvas: Agg canvas of the figure
+    :return: Array of shape (height, width, 3)
+    """
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[:, :, :3].copy()
+
+
+def render_field_background(home_team: str, visiting_team: str, line_of_scrimmage: float, first_down_yard: float,
+                            down: int, width_inches: float = DEFAULT_WIDTH_INCHES,
+                            dpi: int = DEFAULT_DPI) -> np.ndarray:
+    """
+    Draws the static parts of the field once so that they can be reused for every frame
+    :param home_team: Abbreviation of the home team, used for the left endzone
+    :param visiting_team: Abbreviation of the visiting team, used for the right endzone
+    :param line_of_scrimmage: Yard line of the line of scrimmage
+    :param first_down_yard: Yard line of the first down
+    :param down: Down of the play
+    :param width_inches: Width of the image in inches
+    :param dpi: Dots per inch of the image
+    :return: Array of shape (height, width, 3) with the field
+    """
+    from matplotlib.patches import Rectangle
+
+    figure, axes, canvas = _new_figure(width_inches, dpi)
+    axes.add_patch(Rectangle((0, 0), FIELD_LENGTH, FIELD_WIDTH, facecolor='green', zorder=0))
+
+    # Endzones colored by team with the team names
+    for x0, team in [(0, home_team), (110, visiting_team)]:
+        axes.add_patch(Rectangle((x0, 0), 10, FIELD_WIDTH, facecolor=nfl_teams_colors[team][0],
+                                 edgecolor=nfl_teams_colors[team][1], zorder=1))
+        axes.text(x0 + 5, 27, team, color='white', fontsize=20, family='monospace', ha='center', va='center',
+                  rotation=90, zorder=2)
+
+    # 5-yard lines, hashmarks and yard numbers
+    for yard in range(10, 111, 5):
+        axes.plot([yard, yard], [0, FIELD_WIDTH], color='white', linewidth=1.5, zorder=2)
+    hashmarks = np.arange(10, 110)
+    axes.vlines(hashmarks, 23.58 - 0.5, 23.58 + 0.5, color='white', linewidth=1, zorder=2)
+    axes.vlines(hashmarks, FIELD_WIDTH - 23.58 - 0.5, FIELD_WIDTH - 23.58 + 0.5, color='white', linewidth=1,
+                zorder=2)
+    for yard, number in zip(range(20, 101, 10), ['10', '20', '30', '40', '50', '40', '30', '20', '10']):
+        axes.text(yard, 10, number, color='white', fontsize=16, family='monospace', ha='center', va='center',
+                  zorder=2)
+        axes.text(yard, 43.5, number, color='white', fontsize=16, family='monospace', ha='center', va='center',
+                  rotation=180, zorder=2)
+
+    # Line of scrimmage in black, first down line in yellow and the down marker
+    axes.plot([line_of_scrimmage, line_of_scrimmage], [0, FIELD_WIDTH], color='black', linewidth=2, zorder=3)
+    axes.plot([first_down_yard, first_down_yard], [0, FIELD_WIDTH], color='yellow', linewidth=2, zorder=3)
+    axes.add_patch(Rectangle((first_down_yard, 51.3), 2, 2, facecolor='orange', edgecolor='black', zorder=3))
+    axes.text(first_down_yard + 1, 52.3, str(down), color='black', fontsize=8, ha='center', va='center', zorder=4)
+
+    return _figure_to_array(canvas)
+
+
+def _render_frame(background: np.ndarray, frame: dict, width_inches: float, dpi: int) -> np.ndarray:
+    """
+    Helper function to draw the players and vectors of a single frame on top of the field
+    :param background: Field from render_field_background
+    :param frame: Dictionary with the arrays of a frame, from _frame_data
+    :param width_inches: Width of the image in inches
+    :param dpi: Dots per inch of the image
+    :return: Array of shape (height, width, 3) with the frame
+    """
+    figure, axes, canvas = _new_figure(width_inches, dpi)
+    axes.imshow(background, extent=(0, FIELD_LENGTH, 0, FIELD_WIDTH), aspect='auto', zorder=0)
+
+    if 'x_velocity' in frame:
+        axes.quiver(frame['x'], frame['y'], frame['x_velocity'], frame['y_velocity'], color='black',
+                    angles='xy', scale_units='xy', scale=1, width=0.002, zorder=5)
+    if 'x_acceleration' in frame:
+        axes.quiver(frame['x'], frame['y'], frame['x_acceleration'], frame['y_acceleration'], color='red',
+                    angles='xy', scale_units='xy', scale=1, width=0.002, zorder=5)
+
+    axes.scatter(frame['x'], frame['y'], s=120, c=frame['colors'], edgecolors=frame['edge_colors'], linewidths=1,
+                 zorder=6)
+    for x, y, jersey_number in zip(frame['x'], frame['y'], frame['jersey_numbers']):
+        axes.text(x, y, jersey_number, color='white', fontsize=6, family='sans-serif', ha='center', va='center',
+                  zorder=7)
+
+    return _figure_to_array(canvas)
+
+
+# The field and image size are sent to each worker process once instead of with every frame
+_worker_settings = {}
+
+
+def _init_worker(background: np.ndarray, width_inches: float, dpi: int):
+    _worker_settings['background'] = background
+    _worker_settings['width_inches'] = width_inches
+    _worker_settings['dpi'] = dpi
+
+
+def _render_frame_task(frame: dict) -> np.ndarray:
+    return _render_frame(_worker_settings['background'], frame, _worker_settings['width_inches'],
+                         _worker_settings['dpi'])
+
+
+def _frame_data(tracking_frame: pd.DataFrame, acceleration: bool, velocity: bool) -> dict:
+    """
+    Helper function to pull the arrays needed to draw a frame out of the tracking data, so only small arrays are sent
+    to the worker processes
+    :param tracking_frame: Tracking data of a single frame
+    :param acceleration: Whether to draw the acceleration vectors
+    :param velocity: Whether to draw the velocity vectors
+    :return: Dictionary with the arrays of the frame
+    """
+    frame = {
+        'x': tracking_frame['x'].to_numpy(dtype=float),
+        'y': tracking_frame['y'].to_numpy(dtype=float),
+        'colors': [nfl_teams_colors[club][0] for club in tracking_frame['club']],
+        'edge_colors': [nfl_teams_colors[club][1] for club in tracking_frame['club']],
+        'jersey_numbers': ['' if pd.isnull(number) else str(int(number))
+                           for number in tracking_frame['jerseyNumber']]
+    }
+    if velocity:
+        frame['x_velocity'] = tracking_frame['x_velocity_component'].to_numpy(dtype=float)
+        frame['y_velocity'] = tracking_frame['y_velocity_component'].to_numpy(dtype=float)
+    if acceleration:
+        frame['x_acceleration'] = tracking_frame['x_acceleration_component'].to_numpy(dtype=float)
+        frame['y_acceleration'] = tracking_frame['y_acceleration_component'].to_numpy(dtype=float)
+    return frame
+
+
+def _write_output(images: list, output: str, fps: int):
+    """
+    Helper function to write the rendered frames to PNG files, a GIF or an MP4
+    :param images: List of RGB arrays
+    :param output: Path ending in .gif or .mp4, otherwise a directory for the PNG frames
+    :param fps: Frames per second of the animation
+    """
+    from PIL import Image
+
+    extension = os.path.splitext(output)[1].lower()
+    if extension == '.gif':
+        frames = [Image.fromarray(image) for image in images]
+        frames[0].save(output, save_all=True, append_images=frames[1:], duration=int(1000 / fps), loop=0)
+    elif extension == '.mp4':
+        if shutil.which('ffmpeg') is None:
+            raise RuntimeError("ffmpeg is needed to write MP4 files.")
+        height, width, _ = images[0].shape
+        # Pipe the raw frames to ffmpeg, yuv420p needs even dimensions
+        command = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                   '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+                   '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', output]
+        subprocess.run(command, input=b''.join(image.tobytes() for image in images), check=True)
+    else:
+        os.makedirs(output, exist_ok=True)
+        for index, image in enumerate(images):
+            Image.fromarray(image).save(os.path.join(output, f'frame_{index + 1:04d}.png'))
+
+
+def render_play(games: pd.DataFrame, plays: pd.DataFrame, tracking: pd.DataFrame, gameId: int, playId: int,
+                output: str, acceleration=False, velocity=False, fps: int = 10, workers: int = None,
+                width_inches: float = DEFAULT_WIDTH_INCHES, dpi: int = DEFAULT_DPI) -> list:
+    """
+    Renders a singular play for a given game to PNG frames, a GIF or an MP4 without a display
+
+    :param games: DataFrame containing games data
+    :param plays: DataFrame containing plays data
+    :param tracking: DataFrame containing tracking data
+    :param gameId: ID of the game to render
+    :param playId: ID of the play to render
+    :param output: Path ending in .gif or .mp4, otherwise a directory to write a PNG per frame to
+    :param acceleration: Boolean indicating whether to show acceleration vectors. Default is false
+    :param velocity: Boolean indicating whether to show velocity vectors. Default is false
+    :param fps: Frames per second of the GIF or MP4, the tracking is recorded at 10
+    :param workers: Number of processes rendering frames, 1 renders in this process. Defaults to the number of CPUs
+    :param width_inches: Width of the images in inches
+    :param dpi: Dots per inch of the images
+    :return: List of the rendered frames as RGB arrays
+    """
+    # Filter data based on gameId and playId
+    play = plays.query('playId == @playId and gameId == @gameId')
+    tracking = tracking.query('playId == @playId and gameId == @gameId')
+    home_team = games.query('gameId == @gameId')['homeTeamAbbr'].unique()[0]
+    visiting_team = games.query('gameId == @gameId')['visitorTeamAbbr'].unique()[0]
+    down = int(play['down'].iloc[0])
+    line_of_scrimmage = play['absoluteYardlineNumber'].iloc[0]
+
+    # The first down is in front of the line of scrimmage in the direction of the play
+    if tracking['playDirection'].iloc[0] == 'right':
+        first_down_yard = line_of_scrimmage + play['yardsToGo'].iloc[0]
+    else:
+        first_down_yard = line_of_scrimmage - play['yardsToGo'].iloc[0]
+
+    background = render_field_background(home_team, visiting_team, line_of_scrimmage, first_down_yard, down,
+                                         width_inches, dpi)
+
+    frames = [_frame_data(tracking_frame, acceleration, velocity)
+              for _, tracking_frame in tracking.groupby('frameId', sort=True)]
+
+    if workers == 1:
+        _init_worker(background, width_inches, dpi)
+        images = [_render_frame_task(frame) for frame in frames]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(background, width_inches, dpi)) as executor:
+            images = list(executor.map(_render_frame_task, frames))
+
+    _write_output(images, output, fps)
+    return images
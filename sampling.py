@@ -0,0 +1,112 @@
+"""
+File: sampling.py
+Deterministic stratified sampling of plays for quick iteration runs.
+
+sample_plays picks a seedable subset of (gameId, playId) stratified by week, down, quarter and pass/run. Each play is
+ranked within its stratum by a hash of its ids and the seed, so the same seed always picks the same plays no matter
+the order of the plays table. The sample is then pushed down into the tracking load with load_sampled_tracking, so
+only the sampled plays are ever held in memory.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_STRATA = ['week', 'down', 'quarter', 'play_type']
+
+
+def _play_hash(plays: pd.DataFrame, seed: int) -> np.ndarray:
+    """
+    Helper function for a pseudo-random number per play that only depends on its ids and the seed
+    :param plays: DataFrame with the gameId and playId columns
+    :param seed: Seed of the sample
+    :return: Array of unsigned integers
+    """
+    # Numeric columns are hashed without the hash key, so the seed is hashed in as a column
+    ids = plays[['gameId', 'playId']].assign(seed=seed)
+    return pd.util.hash_pandas_object(ids, index=False).to_numpy()
+
+
+def sample_plays(plays: pd.DataFrame, games: pd.DataFrame, fraction: float, seed: int = 0,
+                 strata: list = None) -> pd.DataFrame:
+    """
+    Picks a deterministic stratified sample of plays. The round(fraction * plays) sampled plays are shared between the
+    strata in proportion to their size, with the plays left over by rounding down going to the strata with the largest
+    remainders, so many small strata do not inflate the sample. Strata too small for their share can be left without a
+    play. Every sampled play gets a weight, the size of its stratum over the plays kept from it, to scale statistics
+    back up to the full dataset.
+    :param plays: DataFrame containing the plays data
+    :param games: DataFrame containing the games data, used for the week of each play
+    :param fraction: Fraction of plays to keep, between 0 and 1
+    :param seed: Seed of the sample, the same seed picks the same plays
+    :param strata: Columns to stratify by, defaults to week, down, quarter and play_type (pass or run)
+    :return: DataFrame with the gameId, playId, strata and sample_weight of every sampled play
+    """
+    if not 0 < fraction <= 1:
+        raise ValueError(f"The sample fraction must be between 0 and 1, not {fraction}.")
+    if strata is None:
+        strata = DEFAULT_STRATA
+
+    candidates = plays[['gameId', 'playId', 'down', 'quarter', 'passResult']].drop_duplicates(['gameId', 'playId'])
+    candidates = pd.merge(candidates, games[['gameId', 'week']], on='gameId', how='left')
+    # Plays without a pass result were designed as runs
+    candidates['play_type'] = np.where(candidates['passResult'].isnull(), 'run', 'pass')
+    candidates['play_hash'] = _play_hash(candidates, seed)
+
+    # Rank the plays within each stratum by their hash and keep the lowest ranks
+    candidates = candidates.sort_values(strata + ['play_hash'], ignore_index=True)
+    grouped = candidates.groupby(strata, dropna=False, sort=True)
+    stratum_code = grouped.ngroup().to_numpy()
+    stratum_sizes = grouped.size().to_numpy()
+    stratum_rank = grouped.cumcount()
+
+    # Largest remainder allocation of the sampled plays, ties are broken by the seed
+    quota = stratum_sizes * fraction
+    kept_per_stratum = np.floor(quota).astype(np.int64)
+    total = max(int(round(len(candidates) * fraction)), 1) if len(candidates) > 0 else 0
+    tie_break = np.random.default_rng(seed).random(len(stratum_sizes))
+    largest_remainders = np.lexsort((tie_break, -(quota - kept_per_stratum)))
+    kept_per_stratum[largest_remainders[:total - kept_per_stratum.sum()]] += 1
+
+    stratum_size = stratum_sizes[stratum_code]
+    stratum_keep = kept_per_stratum[stratum_code]
+
+    sample = candidates[stratum_rank < stratum_keep].copy()
+    sample['sample_weight'] = (stratum_size / np.maximum(stratum_keep, 1))[stratum_rank < stratum_keep]
+
+    print("Sampled " + str(len(sample)) + " of " + str(len(candidates)) + " plays.")
+    return sample[['gameId', 'playId'] + strata + ['sample_weight']].sort_values(['gameId', 'playId'],
+                                                                                 ignore_index=True)
+
+
+def filter_to_sample(table: pd.DataFrame, sample: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keeps only the rows of the sampled plays
+    :param table: DataFrame with the gameId and playId columns, e.g. plays, tackles or tracking
+    :param sample: Output of sample_plays
+    :return: DataFrame with only the rows of the sampled plays
+    """
+    sampled_plays = pd.MultiIndex.from_frame(sample[['gameId', 'playId']])
+    return table[pd.MultiIndex.from_frame(table[['gameId', 'playId']]).isin(sampled_plays)]
+
+
+def load_sampled_tracking(tracking_paths: list, sample: pd.DataFrame, chunksize: int = 500000) -> pd.DataFrame:
+    """
+    Reads only the tracking rows of the sampled plays. The CSVs are read in chunks and filtered as they are read, so
+    the full tracking data is never in memory.
+    :param tracking_paths: Paths to the weekly tracking CSVs
+    :param sample: Output of sample_plays
+    :param chunksize: Number of rows to read from the CSVs at a time
+    :return: DataFrame containing the tracking data of the sampled plays
+    """
+    sampled_games = sample['gameId'].unique()
+
+    chunks = []
+    for tracking_path in tracking_paths:
+        for chunk in pd.read_csv(tracking_path, chunksize=chunksize):
+            # Filtering on the gameId alone is cheap and skips the games without sampled plays
+            chunk = chunk[chunk['gameId'].isin(sampled_games)]
+            if len(chunk) > 0:
+                chunks.append(filter_to_sample(chunk, sample))
+
+    if len(chunks) == 0:
+        return pd.read_csv(tracking_paths[0], nrows=0)
+    return pd.concat(chunks, ignore_index=True)
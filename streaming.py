@@ -0,0 +1,219 @@
+"""
+File: streaming.py
+Incremental feature computation for live 10 Hz tracking feeds.
+
+The functions in preprocessing.py work on a complete tracking DataFrame. The StreamingFeatureEngine instead accepts
+the tracking rows of one frame at a time, keeps a small amount of state for every play in progress, and emits the
+velocity/acceleration components, the distance to the ball and the influence degree for that frame.
+
+replay_tracking_csv feeds an existing tracking CSV through the engine at real-time (or accelerated) speed and is used
+as a local stand-in for the live feed.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from precision import get_float_dtype
+from preprocessing import _calculate_influence_vectorized
+
+# Tracking data is recorded at 10 frames per second
+FRAME_INTERVAL_SECONDS = 0.1
+
+# Default time allowed to compute the features of a single frame
+DEFAULT_LATENCY_BUDGET_MS = 100.0
+
+
+class PlayState:
+    """
+    State kept for a single play that is in progress
+    """
+
+    def __init__(self, game_id: int, play_id: int):
+        self.game_id = game_id
+        self.play_id = play_id
+        self.last_frame_id = None
+        self.frames_processed = 0
+        # Last known position of the football, used when a frame arrives without a football row
+        self.last_football_x = np.nan
+        self.last_football_y = np.nan
+
+
+class StreamingFeatureEngine:
+    """
+    Computes the tracking features frame by frame while a play is happening
+    """
+
+    def __init__(self, latency_budget_ms: float = DEFAULT_LATENCY_BUDGET_MS):
+        """
+        :param latency_budget_ms: Time in milliseconds allowed to compute the features of one frame. Frames that take
+        longer are counted in budget_misses
+        """
+        self.latency_budget_ms = latency_budget_ms
+        self.plays = {}
+        self.latencies_ms = []
+        self.budget_misses = 0
+
+    def process_frame(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Computes the features for the tracking rows of a single frame of a single play
+        :param frame: Tracking rows that share the same gameId, playId and frameId
+        :return: The frame with the velocity components, acceleration components, distance to the ball and influence
+        degree added
+        """
+        start = time.perf_counter()
+
+        game_id = int(frame['gameId'].iloc[0])
+        play_id = int(frame['playId'].iloc[0])
+        frame_id = int(frame['frameId'].iloc[0])
+
+        state = self.plays.get((game_id, play_id))
+        if state is None:
+            state = PlayState(game_id, play_id)
+            self.plays[(game_id, play_id)] = state
+
+        # Frames of a live feed can arrive late or twice, only move forward in time
+        if state.last_frame_id is not None and frame_id <= state.last_frame_id:
+            return frame.iloc[0:0]
+
+        float_dtype = get_float_dtype()
+        x = frame['x'].to_numpy(dtype=float_dtype)
+        y = frame['y'].to_numpy(dtype=float_dtype)
+        s = frame['s'].to_numpy(dtype=float_dtype)
+        a = frame['a'].to_numpy(dtype=float_dtype)
+        dir_rad = np.radians(frame['dir'].to_numpy(dtype=float_dtype))
+
+        # Find the football, if it is missing from this frame use the last known position
+        football_mask = (frame['displayName'] == 'football').to_numpy()
+        if football_mask.any():
+            state.last_football_x = x[football_mask][0]
+            state.last_football_y = y[football_mask][0]
+
+        features = frame.copy()
+        features['dir_rad'] = dir_rad
+        features['x_velocity_component'] = s * np.sin(dir_rad)
+        features['y_velocity_component'] = s * np.cos(dir_rad)
+        features['x_acceleration_component'] = a * np.sin(dir_rad)
+        features['y_acceleration_component'] = a * np.cos(dir_rad)
+        features['player_to_football_distance'] = np.sqrt((x - state.last_football_x) ** 2 +
+                                                          (y - state.last_football_y) ** 2)
+        features['influence_degree'] = _calculate_influence_vectorized(x, y, s, dir_rad,
+                                                                       state.last_football_x, state.last_football_y)
+
+        state.last_frame_id = frame_id
+        state.frames_processed += 1
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.latencies_ms.append(latency_ms)
+        if latency_ms > self.latency_budget_ms:
+            self.budget_misses += 1
+
+        return features
+
+    def end_play(self, game_id: int, play_id: int):
+        """
+        Releases the state of a play once it is over
+        :param game_id: ID of the game
+        :param play_id: ID of the play
+        """
+        self.plays.pop((game_id, play_id), None)
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)) -> dict:
+        """
+        Summarizes the time it took to process each frame
+        :param percentiles: Percentiles to report
+        :return: Dictionary with the requested percentiles, the max latency in milliseconds and the budget misses
+        """
+        latencies = np.array(self.latencies_ms) if self.latencies_ms else np.array([np.nan])
+        summary = {f'p{p}': float(np.percentile(latencies, p)) for p in percentiles}
+        summary['max'] = float(np.max(latencies))
+        summary['frames'] = len(self.latencies_ms)
+        summary['budget_misses'] = self.budget_misses
+        return summary
+
+
+def _iterate_plays(tracking_path: str, chunksize: int):
+    """
+    Helper generator to read a tracking CSV one play at a time. The tracking files are stored play by play, so only
+    the play currently being read needs to be kept in memory.
+    :param tracking_path: Path to the tracking CSV
+    :param chunksize: Number of rows to read from the CSV at a time
+    :return: Generator of DataFrames each containing the tracking of one play
+    """
+    pending = None
+    for chunk in pd.read_csv(tracking_path, chunksize=chunksize):
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+
+        # The last play in the chunk might continue in the next chunk, hold it back
+        last_game, last_play = chunk['gameId'].iloc[-1], chunk['playId'].iloc[-1]
+        last_mask = (chunk['gameId'] == last_game) & (chunk['playId'] == last_play)
+        pending = chunk[last_mask]
+
+        for _, play in chunk[~last_mask].groupby(['gameId', 'playId'], sort=False):
+            yield play
+
+    if pending is not None and len(pending) > 0:
+        yield pending
+
+
+def replay_tracking_csv(tracking_path: str, speed: float = 1.0, engine: StreamingFeatureEngine = None,
+                        chunksize: int = 100000, on_frame=None) -> dict:
+    """
+    Replays a tracking CSV through the streaming engine as if it was a live feed
+    :param tracking_path: Path to the tracking CSV
+    :param speed: Replay speed, 1 is real-time, 10 is ten times faster. 0 replays as fast as possible
+    :param engine: Streaming engine to use, a new one is created if not provided
+    :param chunksize: Number of rows to read from the CSV at a time
+    :param on_frame: Optional function called with the features of every frame
+    :return: Dictionary with the latency percentiles of the replay
+    """
+    if engine is None:
+        engine = StreamingFeatureEngine()
+
+    next_frame_due = time.perf_counter()
+    for play in _iterate_plays(tracking_path, chunksize):
+        # Tracking files list each player's whole play before the next player, a live feed sends frame by frame
+        play = play.sort_values('frameId', kind='stable')
+        frame_times = pd.to_datetime(play['time'])
+
+        previous_time = None
+        for frame_id, frame in play.groupby('frameId', sort=True):
+            # Wait until the frame would have arrived, the gap between frames is taken from the time column
+            if speed > 0:
+                frame_time = frame_times.loc[frame.index[0]]
+                gap = FRAME_INTERVAL_SECONDS if previous_time is None else \
+                    (frame_time - previous_time).total_seconds()
+                previous_time = frame_time
+                next_frame_due += min(max(gap, 0.0), 1.0) / speed
+                delay = next_frame_due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # Running behind, do not try to catch up by bursting frames
+                    next_frame_due = time.perf_counter()
+
+            features = engine.process_frame(frame)
+            if on_frame is not None:
+                on_frame(features)
+
+        engine.end_play(int(play['gameId'].iloc[0]), int(play['playId'].iloc[0]))
+
+    return engine.latency_percentiles()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a tracking CSV through the streaming feature engine.')
+    parser.add_argument('tracking_path', help='Path to a tracking CSV')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Replay speed, 1 is real-time and 0 is as fast as possible')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_LATENCY_BUDGET_MS,
+                        help='Latency budget per frame in milliseconds')
+    args = parser.parse_args()
+
+    summary = replay_tracking_csv(args.tracking_path, speed=args.speed,
+                                  engine=StreamingFeatureEngine(latency_budget_ms=args.budget_ms))
+    print("Replayed " + str(summary['frames']) + " frames. Latency (ms) p50: " + str(round(summary['p50'], 3)) +
+          " p90: " + str(round(summary['p90'], 3)) + " p99: " + str(round(summary['p99'], 3)) +
+          " max: " + str(round(summary['max'], 3)) + ". Frames over budget: " + str(summary['budget_misses']))
@@ -132,6 +132,62 @@ class CleaningTests(unittest.TestCase):
     def test_check_for_end(self):
         pass
 
+    def create_broken_tracking(self):
+        # One play with 23 entities over 10 frames, then break it in every way the integrity checks look for
+        frames = np.arange(1, 11)
+        entities = np.arange(23)
+        tracking = pd.DataFrame({"gameId": 33,
+                                 "playId": 24,
+                                 "nflId": np.repeat(np.where(entities == 22, np.nan, 90000 + entities), 10),
+                                 "frameId": np.tile(frames, 23),
+                                 "time": np.tile(pd.Timestamp('2022-09-08 20:35:00') +
+                                                 pd.to_timedelta(frames * 0.1, unit='s'), 23),
+                                 "playDirection": "right",
+                                 "x": np.tile(10 + 0.5 * frames, 23),
+                                 "y": 20.0, "s": 5.0, "a": 0.0, "dis": 0.5, "o": 90.0,
+                                 "dir": np.tile(np.where(frames < 5, 355.0, 5.0), 23),
+                                 "event": np.nan})
+        good_play = tracking.assign(playId=25)
+
+        # A duplicate row, two missing frames of the first player and a direction flip in the last frame
+        broken = pd.concat([tracking, tracking.iloc[[15]]], ignore_index=True)
+        broken = broken.drop(index=[3, 4]).reset_index(drop=True)
+        broken.loc[broken['frameId'] == 10, 'playDirection'] = 'left'
+        return pd.concat([broken, good_play], ignore_index=True)
+
+    def test_check_tracking_integrity(self):
+        flags = cleaning.check_tracking_integrity(self.create_broken_tracking())
+
+        broken, good = flags.loc[(33, 24)], flags.loc[(33, 25)]
+        self.assertEqual(broken['duplicate_rows'], 1)
+        self.assertEqual(broken['missing_frames'], 2)
+        self.assertEqual(broken['longest_gap'], 2)
+        self.assertEqual(broken['min_entities'], 22)
+        self.assertTrue(broken['wrong_entity_count'])
+        self.assertTrue(broken['inconsistent_play_direction'])
+        self.assertFalse(broken['valid'])
+        self.assertTrue(good['valid'])
+
+    def test_repair_tracking(self):
+        tracking = self.create_broken_tracking()
+        repaired = cleaning.repair_tracking(tracking)
+
+        flags = cleaning.check_tracking_integrity(repaired)
+        self.assertEqual(flags['duplicate_rows'].sum(), 0)
+        self.assertEqual(flags['missing_frames'].sum(), 0)
+        self.assertEqual(flags.loc[(33, 24), 'min_entities'], 23)
+
+        filled = repaired[repaired['interpolated']]
+        self.assertEqual(filled['frameId'].tolist(), [4, 5])
+        self.assertTrue(np.allclose(filled['x'], [12, 12.5]))
+        # The direction turns from 355 to 5 degrees through 0, not back through 180
+        self.assertTrue(np.allclose(filled['dir'], [358.33, 1.67], atol=0.01))
+        self.assertEqual(filled['time'].tolist(), list(pd.to_datetime(['2022-09-08 20:35:00.4',
+                                                                       '2022-09-08 20:35:00.5'])))
+
+        # Gaps longer than max_gap are left alone
+        self.assertEqual(cleaning.repair_tracking(tracking, max_gap=1)['interpolated'].sum(), 0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import heatmaps
+import preprocessing
+
+TRACKING_PATH = 'tests/testing_data/bad_tracking_data_week_1.csv'
+
+
+class HeatmapsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tracking = pd.read_csv(TRACKING_PATH)
+        plays = self.tracking[['gameId', 'playId']].drop_duplicates()
+        self.plays = plays.assign(down=np.arange(len(plays)) % 4 + 1, absoluteYardlineNumber=50)
+        players = self.tracking[['nflId']].dropna().drop_duplicates()
+        self.players = players.assign(position=np.where(players['nflId'] % 2 == 0, 'CB', 'WR'))
+
+    def test_chunks_merge_to_the_whole(self):
+        whole = heatmaps.HeatmapAccumulator().add(self.tracking, self.plays, self.players)
+
+        merged = heatmaps.HeatmapAccumulator()
+        for chunk in np.array_split(np.arange(len(self.tracking)), 3):
+            partial = heatmaps.HeatmapAccumulator().add(self.tracking.iloc[chunk], self.plays, self.players)
+            merged.merge(partial)
+
+        self.assertEqual(set(whole.counts), set(merged.counts))
+        for key in whole.counts:
+            self.assertTrue(np.array_equal(whole.counts[key], merged.counts[key]))
+        self.assertEqual(merged.rows_added, (self.tracking['displayName'] != 'football').sum())
+
+    def test_normalized_like_all_plays_left_to_right(self):
+        _, normalized = preprocessing.all_plays_left_to_right(self.plays, self.tracking)
+        accumulator = heatmaps.HeatmapAccumulator(by=('club',)).add(self.tracking)
+        expected = heatmaps.HeatmapAccumulator(by=('club',)).add(normalized, normalize=False)
+
+        for key in expected.counts:
+            self.assertTrue(np.array_equal(accumulator.heatmap(*key), expected.heatmap(*key)))
+
+    def test_merge_requires_same_bins(self):
+        with self.assertRaises(ValueError):
+            heatmaps.HeatmapAccumulator(bin_size=1).merge(heatmaps.HeatmapAccumulator(bin_size=2))
+
+    def test_aggregate_heatmaps_in_parallel(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Two weeks with the same plays should count every position twice
+            paths = [os.path.join(directory, f'tracking_week_{week}.csv') for week in [1, 2]]
+            for path in paths:
+                self.tracking.to_csv(path, index=False)
+
+            accumulator = heatmaps.aggregate_heatmaps(paths, self.plays, self.players, chunksize=1000, workers=2)
+
+        single_week = heatmaps.HeatmapAccumulator().add(self.tracking, self.plays, self.players)
+        self.assertEqual(accumulator.rows_added, 2 * single_week.rows_added)
+        totals = accumulator.to_frame().groupby('club')['count'].sum()
+        self.assertEqual(totals.sum(), 2 * single_week.rows_added)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import cleaning
+import partitioned
+
+TRACKING_PATH = 'tests/testing_data/bad_tracking_data_week_1.csv'
+
+
+class PartitionedTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.partition_dir = os.path.join(self.directory.name, 'partitions')
+        self.output_dir = os.path.join(self.directory.name, 'features')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_partition_tracking_by_game(self):
+        partition_paths = partitioned.partition_tracking_by_game([TRACKING_PATH], self.partition_dir, chunksize=1000)
+        self.assertEqual(len(partition_paths), 1, "The testing data only contains one game.")
+        self.assertEqual(len(pd.read_csv(partition_paths[0])), len(pd.read_csv(TRACKING_PATH)))
+
+        # Partitioning again should replace the partitions, not append to them
+        partition_paths = partitioned.partition_tracking_by_game([TRACKING_PATH], self.partition_dir, chunksize=1000)
+        self.assertEqual(len(pd.read_csv(partition_paths[0])), len(pd.read_csv(TRACKING_PATH)))
+
+    def test_run_partitioned_matches_in_memory(self):
+        partition_paths = partitioned.partition_tracking_by_game([TRACKING_PATH], self.partition_dir)
+        partitioned.run_partitioned(partition_paths, self.output_dir)
+        result = pd.concat(partitioned.read_partitioned_output(self.output_dir))
+
+        tracking = cleaning.clean_tracking_data(pd.read_csv(TRACKING_PATH))
+        for feature in partitioned.DEFAULT_FEATURES:
+            tracking = feature(tracking)
+
+        self.assertEqual(len(result), len(tracking))
+        self.assertEqual(sorted(result.columns), sorted(tracking.columns))
+        self.assertTrue(np.allclose(result['player_to_football_distance'], tracking['player_to_football_distance'],
+                                    equal_nan=True))
+        self.assertTrue(np.allclose(result['influence_degree'], tracking['influence_degree'], equal_nan=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+import pipeline
+
+
+class PipelineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = {'data_dir': self.directory.name, 'checkpoint_dir': os.path.join(self.directory.name, 'ckpt')}
+        self.calls = []
+        self.lock = threading.Lock()
+
+        def stage(name, value):
+            def run(inputs, config):
+                with self.lock:
+                    self.calls.append(name)
+                return value + sum(inputs.values())
+            return run
+
+        self.stages = {
+            'a': ([], stage('a', 1)),
+            'b': ([], stage('b', 10)),
+            'c': (['a', 'b'], stage('c', 100)),
+            'd': (['c'], stage('d', 1000))
+        }
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_required_stages(self):
+        self.assertEqual(pipeline.required_stages(['c'], self.stages), ['a', 'b', 'c'])
+        self.assertEqual(pipeline.dependent_stages(['b'], self.stages), {'b', 'c', 'd'})
+        with self.assertRaises(ValueError):
+            pipeline.required_stages(['e'], self.stages)
+
+    def test_run_pipeline_resumes_from_checkpoints(self):
+        outputs = pipeline.run_pipeline(self.config, targets=['d'], stages=self.stages)
+        self.assertEqual(outputs['d'], 1111)
+        self.assertEqual(sorted(self.calls), ['a', 'b', 'c', 'd'])
+
+        # Every stage has a checkpoint now, so nothing should run again
+        self.calls.clear()
+        outputs = pipeline.run_pipeline(self.config, targets=['d'], stages=self.stages)
+        self.assertEqual(outputs['d'], 1111)
+        self.assertEqual(self.calls, [])
+
+        # Rerunning a stage also reruns the stages that depend on it
+        pipeline.run_pipeline(self.config, targets=['d'], rerun=['b'], stages=self.stages)
+        self.assertEqual(sorted(self.calls), ['b', 'c', 'd'])
+
+    def test_run_pipeline_keeps_checkpoints_of_finished_stages(self):
+        def fail(inputs, config):
+            raise RuntimeError("Stage failed")
+
+        failing_stages = dict(self.stages, d=(['c'], fail))
+        with self.assertRaises(RuntimeError):
+            pipeline.run_pipeline(self.config, targets=['d'], stages=failing_stages)
+
+        self.calls.clear()
+        outputs = pipeline.run_pipeline(self.config, targets=['d'], stages=self.stages)
+        self.assertEqual(outputs['d'], 1111)
+        self.assertEqual(self.calls, ['d'], "Only the failed stage should run again.")
+
+    def test_run_pipeline_reruns_checkpoints_built_with_other_settings(self):
+        import precision
+
+        stages = dict(self.stages, a=([], lambda inputs, config: config['precision']),
+                      c=(['a'], lambda inputs, config: inputs['a'] + '!'))
+        outputs = pipeline.run_pipeline(self.config, targets=['c'], stages=stages)
+        self.assertEqual(outputs['c'], 'float32!')
+
+        # Changing the precision reruns the stage and the stages downstream of it
+        with precision.use_precision('float64'):
+            outputs = pipeline.run_pipeline(self.config, targets=['c'], stages=stages)
+        self.assertEqual(outputs['c'], 'float64!')
+
+        # A stage setting only reruns that stage and the stages downstream of it
+        self.calls.clear()
+        stages = dict(self.stages, features=([], lambda inputs, config: config.get('crop')))
+        pipeline.run_pipeline(self.config, targets=['d', 'features'], stages=stages)
+        self.calls.clear()
+        outputs = pipeline.run_pipeline(dict(self.config, crop=True), targets=['d', 'features'], stages=stages)
+        self.assertEqual(self.calls, [])
+        self.assertTrue(outputs['features'])
+
+    def test_changed_input_files_rerun_the_stages_reading_them(self):
+        def read_games(inputs, config):
+            with open(os.path.join(config['data_dir'], pipeline.GAMES_FILE)) as games_file:
+                return games_file.read()
+
+        stages = {'games': ([], read_games), 'summary': (['games'], lambda inputs, config: inputs['games'].upper())}
+        with open(os.path.join(self.directory.name, pipeline.GAMES_FILE), 'w') as games_file:
+            games_file.write('gameId\n1\n')
+        pipeline.run_pipeline(self.config, stages=stages)
+
+        # Editing the file reruns the stage that reads it and the stages downstream of it
+        with open(os.path.join(self.directory.name, pipeline.GAMES_FILE), 'a') as games_file:
+            games_file.write('2\n')
+        outputs = pipeline.run_pipeline(self.config, stages=stages)
+        self.assertEqual(outputs['summary'], 'GAMEID\n1\n2\n')
+
+        # So does pointing the same checkpoints at another data directory
+        with tempfile.TemporaryDirectory() as other_directory:
+            with open(os.path.join(other_directory, pipeline.GAMES_FILE), 'w') as games_file:
+                games_file.write('gameId\n3\n')
+            outputs = pipeline.run_pipeline(dict(self.config, data_dir=other_directory), stages=stages)
+        self.assertEqual(outputs['summary'], 'GAMEID\n3\n')
+
+    def test_dropping_the_sample_reruns_the_sample(self):
+        stages = {'sample': ([], lambda inputs, config: config.get('sample_fraction')),
+                  'checked_plays': (['sample'], lambda inputs, config: 'all' if inputs['sample'] is None else 'some')}
+        outputs = pipeline.run_pipeline(dict(self.config, sample_fraction=0.5), stages=stages)
+        self.assertEqual(outputs['checked_plays'], 'some')
+
+        outputs = pipeline.run_pipeline(self.config, targets=['checked_plays'], stages=stages)
+        self.assertEqual(outputs['checked_plays'], 'all', "Running without a sample should not resume the old one.")
+
+    def test_integrity_is_checked_before_repair(self):
+        import pandas as pd
+
+        tracking = pd.read_csv('tests/testing_data/bad_tracking_data_week_1.csv')
+        tracking = pd.concat([tracking, tracking.iloc[[0]]], ignore_index=True)
+        stages = {'tracking': ([], lambda inputs, config: tracking),
+                  'integrity': pipeline.STAGES['integrity'],
+                  'repaired_tracking': pipeline.STAGES['repaired_tracking']}
+
+        outputs = pipeline.run_pipeline(dict(self.config, repair=True), stages=stages)
+        self.assertEqual(outputs['integrity']['duplicate_rows'].sum(), 1, "The duplicate should be reported.")
+        self.assertEqual(len(outputs['repaired_tracking']), len(tracking) - 1)
+
+        outputs = pipeline.run_pipeline(self.config, stages=stages)
+        self.assertIsNone(outputs['repaired_tracking'], "Without repair the tracking stage is used as is.")
+
+    def test_heavy_modules_are_imported_lazily(self):
+        result = subprocess.run([sys.executable, '-c', 'import sys, pipeline; '
+                                                       'print(sorted({"pandas", "plotly"} & set(sys.modules)))'],
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '[]', "Importing the pipeline should not import pandas or plotly.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import importlib.util
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import cleaning
+import preprocessing
+from engines import use_engine
+
+TRACKING_PATH = 'tests/testing_data/bad_tracking_data_week_1.csv'
+SORT_KEYS = ['gameId', 'playId', 'frameId', 'displayName']
+
+
+def run_tracking_stages(engine: str, tracking: pd.DataFrame) -> pd.DataFrame:
+    with use_engine(engine):
+        tracking = cleaning.clean_tracking_data(tracking.copy())
+        tracking = preprocessing.create_acceleration_vectors(tracking)
+        tracking = preprocessing.create_velocity_vectors(tracking)
+        tracking = preprocessing.create_player_influence(tracking)
+        tracking = preprocessing.create_distance_to_ball(tracking)
+    return tracking.sort_values(SORT_KEYS).reset_index(drop=True)
+
+
+@unittest.skipIf(importlib.util.find_spec('polars') is None or importlib.util.find_spec('pyarrow') is None,
+                 "The polars engine requires polars and pyarrow.")
+class PolarsEngineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tracking = pd.read_csv(TRACKING_PATH)
+
+    def test_tracking_stages_match_pandas(self):
+        expected = run_tracking_stages('pandas', self.tracking)
+        result = run_tracking_stages('polars', self.tracking)
+
+        self.assertEqual(sorted(result.columns), sorted(expected.columns))
+        self.assertEqual(len(result), len(expected))
+        for column in ['gameId', 'playId', 'frameId', 'nflId', 'time', 'event']:
+            self.assertTrue(result[column].equals(expected[column]) or
+                            (result[column].isnull() == expected[column].isnull()).all(), column)
+        for column in ['x', 'y', 'dir_rad', 'x_velocity_component', 'y_acceleration_component', 'influence_degree',
+                       'player_to_football_distance']:
+            self.assertEqual(result[column].dtype, expected[column].dtype, column)
+            self.assertTrue(np.allclose(result[column], expected[column], rtol=1e-5, equal_nan=True), column)
+
+    def test_approximate_influence_matches_pandas(self):
+        tracking = preprocessing.create_velocity_vectors(self.tracking)
+        expected = preprocessing.create_player_influence(tracking, approximate=True).sort_values(SORT_KEYS)
+        with use_engine('polars'):
+            result = preprocessing.create_player_influence(tracking, approximate=True).sort_values(SORT_KEYS)
+
+        self.assertTrue(np.allclose(result['influence_degree'], expected['influence_degree'], equal_nan=True))
+
+    def test_clean_plays_matches_pandas(self):
+        int_columns = ['gameId', 'playId', 'ballCarrierId', 'quarter', 'down', 'yardsToGo', 'yardlineNumber',
+                       'preSnapHomeScore', 'preSnapVisitorScore', 'prePenaltyPlayResult', 'playResult',
+                       'absoluteYardlineNumber']
+        float_columns = ['passLength', 'penaltyYards', 'defendersInTheBox', 'passProbability',
+                         'preSnapHomeTeamWinProbability', 'preSnapVisitorTeamWinProbability',
+                         'homeTeamWinProbabilityAdded', 'visitorTeamWinProbilityAdded', 'expectedPoints',
+                         'expectedPointsAdded']
+        plays = pd.DataFrame({column: np.arange(10) for column in int_columns})
+        for column in float_columns:
+            plays[column] = np.linspace(0, 1, 10)
+        # One play nullified by penalty, one with a missing penalty flag and one without expectedPointsAdded
+        plays['playNullifiedByPenalty'] = ['N', 'Y', None, 'N', 'N', 'N', 'N', 'N', 'N', 'N']
+        plays.loc[3, 'expectedPointsAdded'] = np.nan
+
+        expected = cleaning.clean_plays_data(plays.copy())
+        with use_engine('polars'):
+            result = cleaning.clean_plays_data(plays.copy())
+
+        self.assertEqual(result['playId'].tolist(), expected['playId'].tolist())
+        self.assertIn(2, result['playId'].tolist(), "A missing penalty flag should not drop the play.")
+
+    def test_check_for_ball_carrier_matches_pandas(self):
+        plays = pd.DataFrame({"gameId": [2022090800, 2022090800, 2022090800],
+                              "playId": [393, 414, 438],
+                              "ballCarrierId": [46180, 1, 46180]})
+        expected = cleaning.check_for_ball_carrier(plays, self.tracking)
+        with use_engine('polars'):
+            result = cleaning.check_for_ball_carrier(plays, self.tracking)
+
+        self.assertEqual(expected['playId'].tolist(), [393])
+        self.assertEqual(result['playId'].tolist(), expected['playId'].tolist())
+
+    def test_event_checks_match_pandas(self):
+        plays = self.tracking[['gameId', 'playId']].drop_duplicates().reset_index(drop=True)
+        for check in [cleaning.check_for_snap, cleaning.check_for_end]:
+            expected = check(plays, self.tracking)
+            with use_engine('polars'):
+                result = check(plays, self.tracking)
+
+            self.assertLess(len(expected), len(plays), "The test data should have plays missing the events.")
+            self.assertEqual(result['playId'].tolist(), expected['playId'].tolist())
+
+    def test_arrow_tables_stay_arrow_tables(self):
+        import pyarrow as pa
+
+        with use_engine('polars'):
+            result = preprocessing.create_velocity_vectors(pa.Table.from_pandas(self.tracking))
+        self.assertIsInstance(result, pa.Table)
+        self.assertIn('x_velocity_component', result.column_names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import cleaning
+import precision
+import preprocessing
+
+TRACKING_PATH = 'tests/testing_data/bad_tracking_data_week_1.csv'
+
+FEATURE_COLUMNS = ['dir_rad', 'x_velocity_component', 'y_velocity_component', 'x_acceleration_component',
+                   'y_acceleration_component', 'influence_degree', 'player_to_football_distance']
+
+
+def run_features(precision_name: str) -> pd.DataFrame:
+    with precision.use_precision(precision_name):
+        tracking = cleaning.clean_tracking_data(pd.read_csv(TRACKING_PATH))
+        tracking = preprocessing.create_acceleration_vectors(tracking)
+        tracking = preprocessing.create_velocity_vectors(tracking)
+        tracking = preprocessing.create_player_influence(tracking)
+        tracking = preprocessing.create_distance_to_ball(tracking)
+    return tracking
+
+
+class PrecisionTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.compact = run_features('float32')
+        cls.exact = run_features('float64')
+
+    def test_no_hidden_upcasts(self):
+        for column in FEATURE_COLUMNS + ['x', 'y', 's', 'a', 'dir']:
+            self.assertEqual(self.compact[column].dtype, np.float32,
+                             "{} should stay float32 in the compact precision.".format(column))
+            self.assertEqual(self.exact[column].dtype, np.float64,
+                             "{} should be float64 in the exact precision.".format(column))
+
+    def test_accuracy_difference(self):
+        # Report how far the compact precision is from the exact one for every feature
+        for column in FEATURE_COLUMNS:
+            compact = self.compact[column].to_numpy(dtype='float64')
+            exact = self.exact[column].to_numpy()
+            valid = ~np.isnan(exact)
+            scale = np.maximum(np.abs(exact[valid]), np.abs(exact[valid]).max() * 1e-3)
+            relative_error = np.max(np.abs(compact[valid] - exact[valid]) / scale)
+            print(f"{column}: max relative difference between float32 and float64 is {relative_error:.2e}")
+            self.assertLess(relative_error, 1e-3, "{} differs too much between the precisions.".format(column))
+
+    def test_set_precision(self):
+        with self.assertRaises(ValueError):
+            precision.set_precision('float16')
+        self.assertEqual(precision.get_precision(), 'float32', "The default precision should be float32.")
+
+
+if __name__ == '__main__':
+    unittest.main()
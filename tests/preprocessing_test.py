@@ -0,0 +1,238 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import preprocessing
+
+TRACKING_PATH = 'tests/testing_data/bad_tracking_data_week_1.csv'
+
+
+class PreprocessingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.create_straight_line_tracking()
+
+    def create_straight_line_tracking(self):
+        # Two players running in straight lines at constant speed, stored player by player like the raw tracking
+        frames = np.arange(1, 21)
+        data = {"gameId": np.repeat(33, 40),
+                "playId": np.repeat(24, 40),
+                "nflId": np.repeat([90234, 90235], 20),
+                "displayName": np.repeat(["Hank Rugg", "Other Player"], 20),
+                "frameId": np.tile(frames, 2),
+                "x": np.concatenate([10 + 0.5 * frames, 60 - 0.2 * frames]),
+                "y": np.concatenate([np.repeat(20.0, 20), 30 + 0.2 * frames])}
+
+        self.straight_line_tracking = pd.DataFrame(data)
+
+    def test_derived_kinematics_constant_speed(self):
+        data = preprocessing.create_derived_kinematics(self.straight_line_tracking)
+        first_player = data.query('nflId == 90234')
+        second_player = data.query('nflId == 90235')
+
+        self.assertTrue(np.allclose(first_player['derived_s'], 5.0),
+                        "A player moving 0.5 yards a frame should have a speed of 5 yards per second.")
+        self.assertTrue(np.allclose(first_player['derived_dir'], 90.0),
+                        "A player moving along the x-axis should have a direction of 90 degrees.")
+        self.assertTrue(np.allclose(second_player['derived_s'], np.hypot(2, 2)))
+        # Differencing twice amplifies the float32 rounding of the positions
+        self.assertTrue(np.allclose(data['derived_a'], 0.0, atol=1e-3), "Constant speed should have no acceleration.")
+        self.assertTrue(np.allclose(data['derived_jerk'], 0.0, atol=1e-2), "Constant speed should have no jerk.")
+
+    def test_derived_kinematics_keeps_row_order(self):
+        shuffled = self.straight_line_tracking.sample(frac=1, random_state=0)
+        data = preprocessing.create_derived_kinematics(shuffled)
+        self.assertTrue(data.index.equals(shuffled.index))
+        self.assertTrue(np.allclose(data['x_smoothed'], shuffled['x']),
+                        "Smoothing a straight line should not move it.")
+
+    def test_derived_kinematics_missing_position_stays_local(self):
+        tracking = pd.read_csv(TRACKING_PATH)
+        tracking.loc[101, 'x'] = np.nan
+        data = preprocessing.create_derived_kinematics(tracking)
+
+        # A missing position is skipped by the windows around it instead of spreading to every later track
+        self.assertEqual(data['x_smoothed'].isnull().sum(), 0)
+        self.assertAlmostEqual(data.loc[101, 'x_smoothed'], tracking.loc[[100, 102], 'x'].mean(), delta=1)
+
+    def test_event_index(self):
+        tracking = pd.read_csv(TRACKING_PATH)
+        event_index = preprocessing.create_event_index(tracking)
+
+        self.assertEqual(len(event_index), 8, "There should be one row for each play.")
+        self.assertEqual(event_index.loc[(2022090800, 393), 'ball_snap'], 6)
+        self.assertEqual(event_index.loc[(2022090800, 393), 'tackle'], 52)
+        self.assertTrue(pd.isna(event_index.loc[(2022090800, 414), 'ball_snap']),
+                        "Plays without a snap should have a missing ball_snap frame.")
+
+    def test_crop_to_event_window(self):
+        tracking = pd.read_csv(TRACKING_PATH)
+        cropped = preprocessing.crop_to_event_window(tracking, start_events=('ball_snap', 'pass_outcome_caught'),
+                                                     frames_before=1, drop_incomplete=True)
+
+        play = cropped.query('playId == 393')
+        self.assertEqual(play['frameId'].min(), 5)
+        self.assertEqual(play['frameId'].max(), 52)
+        self.assertNotIn(896, cropped['playId'].unique(), "Plays without an end event should be dropped.")
+
+        uncropped = preprocessing.crop_to_event_window(tracking)
+        self.assertEqual(uncropped.query('playId == 896')['frameId'].max(), 41,
+                         "Plays without an end event should keep their last frames.")
+
+    def test_play_influence_summary(self):
+        tracking = pd.DataFrame({"gameId": np.repeat(33, 6),
+                                 "playId": np.repeat(24, 6),
+                                 "nflId": [90234, 90234, 90234, np.nan, np.nan, np.nan],
+                                 "frameId": [1, 2, 3, 1, 2, 3],
+                                 "influence_degree": [0.1, 0.3, 0.2, 0.0, 0.0, 0.0],
+                                 "player_to_football_distance": [12.0, 8.0, 4.0, 0.0, 0.0, 0.0]})
+        tackles = pd.DataFrame({"gameId": [33], "playId": [24], "nflId": [90234], "tackle": [1], "assist": [0],
+                                "forcedFumble": [0], "pff_missedTackle": [0]})
+        summary = preprocessing.create_play_influence_summary(tracking, tackles, radius=10)
+
+        self.assertEqual(len(summary), 1, "The football should not be summarized.")
+        row = summary.iloc[0]
+        self.assertAlmostEqual(row['max_influence'], 0.3)
+        self.assertAlmostEqual(row['mean_influence'], 0.2)
+        self.assertAlmostEqual(row['influence_integral'], 0.06)
+        self.assertEqual(row['min_distance_to_ball'], 4.0)
+        self.assertEqual(row['frames_within_radius'], 2)
+        self.assertAlmostEqual(row['time_of_first_entry'], 0.1)
+        self.assertEqual(row['tackle'], 1)
+        self.assertNotIn('first_entry_frameId', summary.columns, "Helper columns should not be left in the summary.")
+
+        # Resampled at 5 Hz the frames are 0.2s apart, so the integral and the time of first entry double
+        resampled = tracking.assign(time_since_reference=(tracking['frameId'] - 1) * 0.2)
+        row = preprocessing.create_play_influence_summary(resampled, tackles, radius=10, frame_interval=0.2).iloc[0]
+        self.assertAlmostEqual(row['influence_integral'], 0.12)
+        self.assertAlmostEqual(row['time_of_first_entry'], 0.2)
+
+        # Refreshing with the same play replaces it instead of duplicating it
+        new_tracking = tracking.assign(playId=25)
+        summary = preprocessing.update_play_influence_summary(summary, tracking, tackles)
+        summary = preprocessing.update_play_influence_summary(summary, new_tracking, tackles)
+        self.assertEqual(summary['playId'].tolist(), [24, 25])
+        self.assertEqual(summary['tackle'].tolist(), [1, 0])
+
+    def test_influence_field_pruning_error_bound(self):
+        tracking = preprocessing.create_velocity_vectors(pd.read_csv(TRACKING_PATH))
+        frame = tracking.query('playId == 414 and frameId == 10')
+        keys = ['frameId', 'club', 'point']
+
+        exact = preprocessing.create_influence_field(frame, grid_resolution=2, error_bound=0).set_index(keys)
+        pruned = preprocessing.create_influence_field(frame, grid_resolution=2, error_bound=1e-5).set_index(keys)
+
+        self.assertLess(len(pruned), len(exact), "Pruning should skip the points far away from every player.")
+        difference = (exact['influence'] - pruned['influence'].reindex(exact.index).fillna(0)).abs()
+        players_per_club = frame.query("displayName != 'football'").groupby('club').size().max()
+        self.assertLessEqual(difference.max(), 1e-5 * players_per_club)
+
+    def test_influence_lookup_within_error_bound(self):
+        random = np.random.default_rng(0)
+        size = 100000
+        x_player, y_player = random.uniform(0, 120, size), random.uniform(0, 53.3, size)
+        s_player, dir_rad_player = random.uniform(0, 12, size), random.uniform(0, 2 * np.pi, size)
+        x_target, y_target = x_player + random.normal(0, 5, size), y_player + random.normal(0, 5, size)
+        s_player[0] = np.nan
+
+        exact = preprocessing._calculate_influence_vectorized(x_player, y_player, s_player, dir_rad_player,
+                                                              x_target, y_target)
+        approximate = preprocessing._calculate_influence_lookup(x_player, y_player, s_player, dir_rad_player,
+                                                                x_target, y_target, chunk_size=4096)
+
+        self.assertTrue(np.isnan(approximate[0]), "A missing speed should give a missing influence.")
+        self.assertLessEqual(np.nanmax(np.abs(exact - approximate)), preprocessing.influence_lookup_error_bound(12))
+
+        # A finer table has a smaller bound
+        self.assertLess(preprocessing.influence_lookup_error_bound(12, speed_step=0.01, direction_bins=3600),
+                        preprocessing.influence_lookup_error_bound(12))
+        with self.assertRaises(ValueError):
+            preprocessing.influence_lookup_error_bound(preprocessing.MAX_SPEED)
+
+    def test_benchmark_influence(self):
+        results = preprocessing.benchmark_influence(TRACKING_PATH, repeats=1)
+        self.assertEqual(results['precision'].tolist(), ['float32', 'float64'])
+        self.assertTrue((results['max_error'] <= results['error_bound']).all())
+        # The football is faster than MAX_SPEED in this data, it is left out instead of inflating the bound
+        self.assertTrue((results['excluded_rows'] > 0).all())
+        self.assertTrue((results['error_bound'] < 1e-3).all())
+
+    def test_influence_lookup_error_bound_needs_covered_speeds(self):
+        with self.assertRaises(ValueError):
+            preprocessing.influence_lookup_error_bound(preprocessing.MAX_SPEED - 0.01)
+
+    def test_ball_carrier_frame(self):
+        # The carrier runs along the x-axis, a defender is 2 yards ahead and 1 yard to the right running the other way
+        tracking = pd.DataFrame({"gameId": [33, 33, 33, 33],
+                                 "playId": [24, 24, 25, 25],
+                                 "nflId": [90234, 90235, 90234, 90235],
+                                 "frameId": [1, 1, 1, 1],
+                                 "x": [10.0, 12.0, 10.0, 12.0],
+                                 "y": [20.0, 19.0, 20.0, 19.0],
+                                 "s": [5.0, 3.0, 5.0, 3.0],
+                                 "dir": [90.0, 270.0, 90.0, 270.0],
+                                 "o": [90.0, 270.0, 90.0, 270.0]})
+        plays = pd.DataFrame({"gameId": [33, 33], "playId": [24, 25], "ballCarrierId": [90234, 1]})
+
+        data = preprocessing.create_ball_carrier_frame(tracking, plays)
+        carrier, defender = data.iloc[0], data.iloc[1]
+
+        self.assertEqual(data['carrier_forward'].dtype, np.float32)
+        self.assertAlmostEqual(carrier['carrier_distance'], 0)
+        self.assertAlmostEqual(defender['carrier_forward'], 2, places=5)
+        self.assertAlmostEqual(defender['carrier_lateral'], 1, places=5)
+        self.assertAlmostEqual(defender['carrier_forward_velocity'], -8, places=5)
+        self.assertAlmostEqual(defender['carrier_lateral_velocity'], 0, places=5)
+        self.assertAlmostEqual(defender['carrier_relative_dir'], 180)
+        self.assertTrue(data.iloc[2:]['carrier_forward'].isnull().all(),
+                        "Plays without their ball carrier in the tracking should be missing.")
+
+    def test_resample_tracking(self):
+        tracking = pd.read_csv(TRACKING_PATH)
+        play = tracking.query('playId == 393')
+        resampled = preprocessing.resample_tracking(play, frequency=5)
+
+        # At 5 Hz every other frame is kept and all tracks of the play share the same grid
+        players = play['nflId'].nunique(dropna=False)
+        self.assertAlmostEqual(len(resampled), len(play) / 2, delta=2 * players)
+        frames_per_track = resampled.groupby(resampled['nflId'].fillna(-1))['frameId'].agg(['min', 'max', 'size'])
+        self.assertTrue((frames_per_track['size'] == frames_per_track['max'] - frames_per_track['min'] + 1).all())
+        grid = resampled['time_since_reference'].to_numpy(dtype='float64') * 5
+        self.assertTrue(np.allclose(grid, np.round(grid), atol=1e-3), "Grid times should be multiples of 0.2s.")
+
+        # The snap is the origin of the grid and is kept on it
+        snaps = resampled.query("event == 'ball_snap'")
+        self.assertEqual(len(snaps), (play['event'] == 'ball_snap').sum())
+        self.assertTrue(np.allclose(snaps['time_since_reference'], 0))
+
+    def test_resample_tracking_keeps_every_frame_at_10_hz(self):
+        # The times jitter by a microsecond, which should not drop the first or last frame of any track
+        tracking = pd.read_csv(TRACKING_PATH)
+        resampled = preprocessing.resample_tracking(tracking, frequency=10)
+
+        self.assertEqual(len(resampled), len(tracking))
+        track = resampled.query('playId == 593 and nflId == 35472')
+        self.assertIn(33, track['frameId'].tolist())
+
+    def test_resample_tracking_interpolates_gaps(self):
+        # Drop a frame and jitter the times, interpolating at 10 Hz should put the straight line back on the grid
+        tracking = self.straight_line_tracking.copy()
+        tracking['time'] = pd.Timestamp('2022-09-08 20:35:00') + pd.to_timedelta(tracking['frameId'] * 0.1, unit='s')
+        tracking['time'] += pd.to_timedelta(np.tile([0, 0.01], 20), unit='s')
+        for column in ['s', 'a', 'dis', 'o', 'dir']:
+            tracking[column] = 1.0
+        tracking['event'] = np.nan
+        tracking = tracking.drop(index=5)
+
+        resampled = preprocessing.resample_tracking(tracking, frequency=10, reference_event=None)
+        first_player = resampled.query('nflId == 90234')
+
+        self.assertEqual(first_player['frameId'].tolist(), list(range(1, 21)),
+                         "The dropped frame should be filled in.")
+        expected_x = 10 + 0.5 * (1 + first_player['time_since_reference'].to_numpy(dtype='float64') * 10)
+        self.assertTrue(np.allclose(first_player['x'], expected_x, atol=0.1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+import preprocessing
+
+TRACKING_PATH = 'tests/testing_data/bad_tracking_data_week_1.csv'
+
+
+@unittest.skipIf(importlib.util.find_spec('matplotlib') is None, "Rendering requires matplotlib.")
+class RenderingTests(unittest.TestCase):
+
+    def setUp(self):
+        tracking = pd.read_csv(TRACKING_PATH).query('playId == 438')
+        self.tracking = preprocessing.create_velocity_vectors(preprocessing.create_acceleration_vectors(tracking))
+        self.games = pd.DataFrame({"gameId": [2022090800], "homeTeamAbbr": ["LA"], "visitorTeamAbbr": ["BUF"]})
+        self.plays = pd.DataFrame({"gameId": [2022090800], "playId": [438], "down": [2],
+                                   "absoluteYardlineNumber": [40], "yardsToGo": [7]})
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_render_play_png_frames(self):
+        output = os.path.join(self.directory.name, 'frames')
+        import rendering
+        images = rendering.render_play(self.games, self.plays, self.tracking, 2022090800, 438, output,
+                                       acceleration=True, velocity=True, workers=1)
+
+        self.assertEqual(len(images), self.tracking['frameId'].nunique(), "There should be one image per frame.")
+        self.assertEqual(len(os.listdir(output)), len(images))
+        self.assertEqual(images[0].shape[2], 3)
+
+    def test_render_play_gif_in_parallel(self):
+        output = os.path.join(self.directory.name, 'play.gif')
+        import rendering
+        parallel = rendering.render_play(self.games, self.plays, self.tracking, 2022090800, 438, output, workers=2)
+        serial = rendering.render_play(self.games, self.plays, self.tracking, 2022090800, 438, output, workers=1)
+
+        self.assertTrue(os.path.exists(output))
+        self.assertTrue(all((a == b).all() for a, b in zip(parallel, serial)),
+                        "Rendering in parallel should give the same frames.")
+
+
+if __name__ == '__main__':
+    unittest.main()
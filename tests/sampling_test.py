@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import sampling
+
+TRACKING_PATH = 'tests/testing_data/bad_tracking_data_week_1.csv'
+
+
+class SamplingTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        number_of_plays = 2000
+        self.plays = pd.DataFrame({"gameId": np.repeat(np.arange(20), number_of_plays // 20),
+                                   "playId": np.tile(np.arange(number_of_plays // 20), 20),
+                                   "down": rng.integers(1, 5, number_of_plays),
+                                   "quarter": rng.integers(1, 5, number_of_plays),
+                                   "passResult": np.where(rng.random(number_of_plays) < 0.6, 'C', None)})
+        self.games = pd.DataFrame({"gameId": np.arange(20), "week": np.arange(20) % 2 + 1})
+
+    def test_sample_is_deterministic(self):
+        sample = sampling.sample_plays(self.plays, self.games, 0.1, seed=3)
+        shuffled = sampling.sample_plays(self.plays.sample(frac=1, random_state=1), self.games, 0.1, seed=3)
+        other_seed = sampling.sample_plays(self.plays, self.games, 0.1, seed=4)
+
+        self.assertTrue(sample.equals(shuffled), "The sample should not depend on the order of the plays.")
+        self.assertFalse(sample[['gameId', 'playId']].equals(other_seed[['gameId', 'playId']]))
+
+    def test_sample_is_stratified(self):
+        sample = sampling.sample_plays(self.plays, self.games, 0.1)
+
+        stratum_sizes = self.plays.merge(self.games, on='gameId').assign(
+            play_type=lambda plays: np.where(plays['passResult'].isnull(), 'run', 'pass')).groupby(
+            sampling.DEFAULT_STRATA).size()
+        sampled_sizes = sample.groupby(sampling.DEFAULT_STRATA).size().reindex(stratum_sizes.index, fill_value=0)
+        self.assertEqual(len(sample), round(len(self.plays) * 0.1))
+        self.assertTrue((sampled_sizes >= np.floor(stratum_sizes * 0.1)).all())
+        self.assertTrue((sampled_sizes <= np.ceil(stratum_sizes * 0.1)).all())
+
+        # Each sampled play stands in for the plays of its stratum
+        weights = sample.groupby(sampling.DEFAULT_STRATA)['sample_weight'].first()
+        self.assertTrue(np.allclose(weights, stratum_sizes[weights.index] / sampled_sizes[weights.index]))
+
+    def test_small_fraction_is_not_inflated(self):
+        # With 64 strata a 1% sample of 2000 plays is 20 plays, rounding every stratum up would give 64
+        for seed in range(3):
+            sample = sampling.sample_plays(self.plays, self.games, 0.01, seed=seed)
+            self.assertEqual(len(sample), 20)
+
+    def test_load_sampled_tracking(self):
+        sample = pd.DataFrame({"gameId": [2022090800, 2022090800], "playId": [393, 933]})
+        tracking = sampling.load_sampled_tracking([TRACKING_PATH], sample, chunksize=500)
+
+        self.assertEqual(sorted(tracking['playId'].unique()), [393, 933])
+        full = pd.read_csv(TRACKING_PATH)
+        self.assertEqual(len(tracking), len(full.query('playId in [393, 933]')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import streaming
+
+TRACKING_PATH = 'tests/testing_data/bad_tracking_data_week_1.csv'
+
+
+class StreamingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tracking = pd.read_csv(TRACKING_PATH)
+
+    def test_process_frame_distance_to_ball(self):
+        frame = self.tracking.query('playId == 393 and frameId == 10')
+        engine = streaming.StreamingFeatureEngine()
+        features = engine.process_frame(frame)
+
+        football = frame.query("displayName == 'football'")
+        expected = np.sqrt((frame['x'] - football['x'].iloc[0]) ** 2 + (frame['y'] - football['y'].iloc[0]) ** 2)
+        self.assertTrue(np.allclose(features['player_to_football_distance'], expected),
+                        "The streaming distance to the ball should match the batch calculation.")
+
+    def test_process_frame_ignores_old_frames(self):
+        engine = streaming.StreamingFeatureEngine()
+        engine.process_frame(self.tracking.query('playId == 393 and frameId == 10'))
+        features = engine.process_frame(self.tracking.query('playId == 393 and frameId == 9'))
+        self.assertEqual(len(features), 0, "Frames older than the last processed frame should be skipped.")
+
+    def test_replay_tracking_csv(self):
+        summary = streaming.replay_tracking_csv(TRACKING_PATH, speed=0, chunksize=500)
+        expected_frames = len(self.tracking[['gameId', 'playId', 'frameId']].drop_duplicates())
+        self.assertEqual(summary['frames'], expected_frames, "Every frame of every play should be replayed once.")
+        self.assertTrue(summary['p50'] <= summary['p99'] <= summary['max'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import cleaning
+import validation
+
+GAMES_PATH = 'tests/testing_data/bad_games_data.csv'
+TRACKING_PATH = 'tests/testing_data/bad_tracking_data_week_1.csv'
+
+
+class ValidationTests(unittest.TestCase):
+
+    def test_validate_games_quarantines_missing_date(self):
+        games = pd.read_csv(GAMES_PATH)
+        valid, quarantine = validation.validate_table(games, validation.GAMES_SCHEMA, 'games')
+
+        self.assertEqual(len(valid) + len(quarantine), len(games), "Every row should be either valid or quarantined.")
+        self.assertEqual(quarantine['gameId'].tolist(), [2022091105])
+        self.assertIn('gameDate is missing', quarantine['reasons'].iloc[0])
+
+    def test_validate_tracking_quarantines_bad_rows(self):
+        tracking = pd.read_csv(TRACKING_PATH, dtype={'frameId': object})
+        tracking.loc[0, 'frameId'] = 'kdf'
+        tracking.loc[1, 'playDirection'] = 'up'
+        tracking.loc[2, 'x'] = 500.0
+        tracking.loc[2, 's'] = np.nan
+
+        valid, quarantine = validation.validate_table(tracking, validation.TRACKING_SCHEMA, 'tracking')
+
+        self.assertEqual(quarantine.index.tolist(), [0, 1, 2])
+        self.assertEqual(quarantine.loc[0, 'reasons'], 'frameId is not a valid int')
+        self.assertEqual(quarantine.loc[1, 'reasons'], 'playDirection is not an allowed value')
+        self.assertEqual(quarantine.loc[2, 'reasons'], 'x is above 130; s is missing')
+
+        # The valid rows should now survive the cleaning casts
+        cleaned = cleaning.clean_tracking_data(valid)
+        self.assertEqual(len(cleaned), len(tracking) - 3)
+
+    def test_validate_all(self):
+        games = pd.read_csv(GAMES_PATH)
+        tracking = pd.read_csv(TRACKING_PATH)
+        empty = {name: pd.DataFrame(columns=list(schema)) for name, schema in validation.SCHEMAS.items()}
+
+        valid_tables, quarantine = validation.validate_all(games, empty['plays'], empty['players'],
+                                                           empty['tackles'], tracking)
+        self.assertEqual(len(valid_tables['tracking']), len(tracking))
+        self.assertEqual(quarantine['table'].tolist(), ['games'])
+
+
+if __name__ == '__main__':
+    unittest.main()
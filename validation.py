@@ -0,0 +1,236 @@
+"""
+File: validation.py
+Declarative schemas for the five input datasets and a validator that quarantines bad rows.
+
+Each schema maps a column name to its expected type, whether it may be missing, and optionally the range or the set
+of values it may take. validate_table checks every column of a table with vectorized masks and moves the rows that
+fail any check to a quarantine table with the reasons they failed, so a single bad row no longer crashes the
+astype calls in cleaning.py or gets silently dropped.
+"""
+import numpy as np
+import pandas as pd
+
+from constants import nfl_teams_colors
+
+# Team abbreviations, the football entry in the colors is not a team
+TEAMS = [team for team in nfl_teams_colors if team != 'football']
+
+GAMES_SCHEMA = {
+    'gameId': {'dtype': 'int', 'nullable': False, 'min': 0},
+    'season': {'dtype': 'int', 'nullable': False, 'min': 1920},
+    'week': {'dtype': 'int', 'nullable': False, 'min': 1, 'max': 22},
+    'gameDate': {'dtype': 'datetime', 'nullable': False},
+    'gameTimeEastern': {'dtype': 'time', 'nullable': False},
+    'homeTeamAbbr': {'dtype': 'str', 'nullable': False, 'values': TEAMS},
+    'visitorTeamAbbr': {'dtype': 'str', 'nullable': False, 'values': TEAMS},
+    'homeFinalScore': {'dtype': 'int', 'nullable': False, 'min': 0},
+    'visitorFinalScore': {'dtype': 'int', 'nullable': False, 'min': 0}
+}
+
+PLAYS_SCHEMA = {
+    'gameId': {'dtype': 'int', 'nullable': False, 'min': 0},
+    'playId': {'dtype': 'int', 'nullable': False, 'min': 0},
+    'ballCarrierId': {'dtype': 'int', 'nullable': False, 'min': 0},
+    'ballCarrierDisplayName': {'dtype': 'str', 'nullable': False},
+    'playDescription': {'dtype': 'str', 'nullable': True},
+    'quarter': {'dtype': 'int', 'nullable': False, 'min': 1, 'max': 5},
+    'down': {'dtype': 'int', 'nullable': False, 'min': 1, 'max': 4},
+    'yardsToGo': {'dtype': 'int', 'nullable': False, 'min': 1, 'max': 99},
+    'possessionTeam': {'dtype': 'str', 'nullable': False, 'values': TEAMS},
+    'defensiveTeam': {'dtype': 'str', 'nullable': False, 'values': TEAMS},
+    # Missing when the line of scrimmage is exactly on the 50 yard line
+    'yardlineSide': {'dtype': 'str', 'nullable': True, 'values': TEAMS},
+    'yardlineNumber': {'dtype': 'int', 'nullable': False, 'min': 0, 'max': 50},
+    'gameClock': {'dtype': 'str', 'nullable': False},
+    'preSnapHomeScore': {'dtype': 'int', 'nullable': False, 'min': 0},
+    'preSnapVisitorScore': {'dtype': 'int', 'nullable': False, 'min': 0},
+    'passResult': {'dtype': 'str', 'nullable': True},
+    'passLength': {'dtype': 'float', 'nullable': True},
+    'penaltyYards': {'dtype': 'float', 'nullable': True},
+    'prePenaltyPlayResult': {'dtype': 'int', 'nullable': False, 'min': -120, 'max': 120},
+    'playResult': {'dtype': 'int', 'nullable': False, 'min': -120, 'max': 120},
+    'playNullifiedByPenalty': {'dtype': 'str', 'nullable': False, 'values': ['Y', 'N']},
+    'absoluteYardlineNumber': {'dtype': 'int', 'nullable': False, 'min': 0, 'max': 120},
+    'offenseFormation': {'dtype': 'str', 'nullable': True},
+    # Plays without defendersInTheBox or expectedPointsAdded are removed by clean_plays_data
+    'defendersInTheBox': {'dtype': 'float', 'nullable': True, 'min': 0, 'max': 11},
+    'passProbability': {'dtype': 'float', 'nullable': True, 'min': 0, 'max': 1},
+    'preSnapHomeTeamWinProbability': {'dtype': 'float', 'nullable': False, 'min': 0, 'max': 1},
+    'preSnapVisitorTeamWinProbability': {'dtype': 'float', 'nullable': False, 'min': 0, 'max': 1},
+    'homeTeamWinProbabilityAdded': {'dtype': 'float', 'nullable': False, 'min': -1, 'max': 1},
+    'visitorTeamWinProbilityAdded': {'dtype': 'float', 'nullable': False, 'min': -1, 'max': 1},
+    'expectedPoints': {'dtype': 'float', 'nullable': False},
+    'expectedPointsAdded': {'dtype': 'float', 'nullable': True},
+    'foulName1': {'dtype': 'str', 'nullable': True},
+    'foulName2': {'dtype': 'str', 'nullable': True},
+    'foulNFLId1': {'dtype': 'float', 'nullable': True},
+    'foulNFLId2': {'dtype': 'float', 'nullable': True}
+}
+
+PLAYERS_SCHEMA = {
+    'nflId': {'dtype': 'int', 'nullable': False, 'min': 0},
+    # Heights are stored as feet-inches, e.g. 6-2
+    'height': {'dtype': 'str', 'nullable': False, 'pattern': r'\d-\d{1,2}'},
+    'weight': {'dtype': 'int', 'nullable': False, 'min': 100, 'max': 500},
+    'birthDate': {'dtype': 'datetime', 'nullable': True},
+    'collegeName': {'dtype': 'str', 'nullable': True},
+    'position': {'dtype': 'str', 'nullable': False},
+    'displayName': {'dtype': 'str', 'nullable': False}
+}
+
+TACKLES_SCHEMA = {
+    'gameId': {'dtype': 'int', 'nullable': False, 'min': 0},
+    'playId': {'dtype': 'int', 'nullable': False, 'min': 0},
+    'nflId': {'dtype': 'int', 'nullable': False, 'min': 0},
+    'tackle': {'dtype': 'int', 'nullable': False, 'values': [0, 1]},
+    'assist': {'dtype': 'int', 'nullable': False, 'values': [0, 1]},
+    'forcedFumble': {'dtype': 'int', 'nullable': False, 'values': [0, 1]},
+    'pff_missedTackle': {'dtype': 'int', 'nullable': False, 'values': [0, 1]}
+}
+
+TRACKING_SCHEMA = {
+    'gameId': {'dtype': 'int', 'nullable': False, 'min': 0},
+    'playId': {'dtype': 'int', 'nullable': False, 'min': 0},
+    # The football has no nflId or jersey number
+    'nflId': {'dtype': 'float', 'nullable': True, 'min': 0},
+    'displayName': {'dtype': 'str', 'nullable': False},
+    'frameId': {'dtype': 'int', 'nullable': False, 'min': 1},
+    'time': {'dtype': 'datetime', 'nullable': False, 'format': 'ISO8601'},
+    'jerseyNumber': {'dtype': 'float', 'nullable': True, 'min': 0, 'max': 99},
+    'club': {'dtype': 'str', 'nullable': False, 'values': list(nfl_teams_colors)},
+    'playDirection': {'dtype': 'str', 'nullable': False, 'values': ['left', 'right']},
+    # Players can be tracked a few yards outside the field
+    'x': {'dtype': 'float', 'nullable': False, 'min': -10, 'max': 130},
+    'y': {'dtype': 'float', 'nullable': False, 'min': -10, 'max': 63.3},
+    's': {'dtype': 'float', 'nullable': False, 'min': 0, 'max': 30},
+    'a': {'dtype': 'float', 'nullable': False, 'min': 0, 'max': 30},
+    'dis': {'dtype': 'float', 'nullable': False, 'min': 0},
+    # The football has no orientation or direction
+    'o': {'dtype': 'float', 'nullable': True, 'min': 0, 'max': 360},
+    'dir': {'dtype': 'float', 'nullable': True, 'min': 0, 'max': 360},
+    'event': {'dtype': 'str', 'nullable': True}
+}
+
+SCHEMAS = {
+    'games': GAMES_SCHEMA,
+    'plays': PLAYS_SCHEMA,
+    'players': PLAYERS_SCHEMA,
+    'tackles': TACKLES_SCHEMA,
+    'tracking': TRACKING_SCHEMA
+}
+
+
+def check_for_missing_columns(data: pd.DataFrame, schema: dict) -> list:
+    """
+    Finds the columns of the schema that are not in the dataset
+    :param data: Dataset to check
+    :param schema: Schema of the dataset
+    :return: List of missing columns
+    """
+    return [column for column in schema if column not in data.columns]
+
+
+def _parse_column(column: pd.Series, rules: dict) -> pd.Series:
+    """
+    Helper function to parse a column into the schema type. Values that can not be parsed become missing.
+    :param column: Column to parse
+    :param rules: Schema rules of the column
+    :return: Parsed column
+    """
+    dtype = rules['dtype']
+    if dtype in ('int', 'float'):
+        return pd.to_numeric(column, errors='coerce')
+    if dtype == 'datetime':
+        # Some of the dates are in different formats, a fixed format is much faster on large tables
+        return pd.to_datetime(column, errors='coerce', format=rules.get('format', 'mixed'))
+    if dtype == 'time':
+        return pd.to_datetime(column, errors='coerce', format='%H:%M:%S')
+    return column
+
+
+def validate_table(data: pd.DataFrame, schema: dict, table_name: str = '') -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Validates every row of a dataset against its schema in one pass. Each check is a vectorized mask over a whole
+    column, and every row that fails a check is moved to the quarantine table with the reasons it failed.
+    :param data: Raw dataset
+    :param schema: Schema of the dataset, e.g. TRACKING_SCHEMA
+    :param table_name: Name of the dataset used in the messages
+    :return: Tuple of the valid rows, with numeric columns parsed, and the quarantined rows with a reasons column
+    """
+    valid = data.copy()
+
+    missing_columns = check_for_missing_columns(valid, schema)
+    if len(missing_columns) > 0:
+        print(f"The {table_name} dataset is missing the following columns: {missing_columns}.")
+
+    # Collect the mask of every check, the reasons are only written out for the rows that fail
+    masks = []
+    labels = []
+
+    def add_reason(mask, reason):
+        masks.append(np.asarray(mask, dtype=bool))
+        labels.append(reason)
+
+    for column, rules in schema.items():
+        if column not in valid.columns:
+            continue
+
+        raw = valid[column]
+        missing = raw.isnull()
+        if not rules.get('nullable', True):
+            add_reason(missing, f'{column} is missing')
+
+        parsed = _parse_column(raw, rules)
+        add_reason(parsed.isnull() & ~missing, f'{column} is not a valid {rules["dtype"]}')
+
+        if rules['dtype'] == 'int':
+            add_reason(parsed.notnull() & (parsed % 1 != 0), f'{column} is not a whole number')
+        if 'min' in rules:
+            add_reason(parsed < rules['min'], f'{column} is below {rules["min"]}')
+        if 'max' in rules:
+            add_reason(parsed > rules['max'], f'{column} is above {rules["max"]}')
+        if 'values' in rules:
+            add_reason(parsed.notnull() & ~parsed.isin(rules['values']), f'{column} is not an allowed value')
+        if 'pattern' in rules:
+            add_reason(parsed.notnull() & ~parsed.astype(str).str.fullmatch(rules['pattern']),
+                       f'{column} does not match {rules["pattern"]}')
+
+        # Keep the numbers parsed so that the cleaning casts do not have to parse strings again
+        if rules['dtype'] in ('int', 'float'):
+            valid[column] = parsed
+
+    failures = np.column_stack(masks) if len(masks) > 0 else np.zeros((len(valid), 0), dtype=bool)
+    bad_rows = failures.any(axis=1)
+    quarantine = data[bad_rows].copy()
+    quarantine['reasons'] = ['; '.join(labels[check] for check in np.flatnonzero(row_failures))
+                             for row_failures in failures[bad_rows]]
+    valid = valid[~bad_rows]
+
+    print(f"Validated the {table_name} dataset, " + str(len(quarantine)) + " of " + str(len(data)) +
+          " rows were quarantined.")
+
+    return valid, quarantine
+
+
+def validate_all(games: pd.DataFrame, plays: pd.DataFrame, players: pd.DataFrame, tackles: pd.DataFrame,
+                 tracking: pd.DataFrame) -> tuple[dict, pd.DataFrame]:
+    """
+    Validates all five datasets and collects the quarantined rows into one table
+    :param games: Raw games dataset
+    :param plays: Raw plays dataset
+    :param players: Raw players dataset
+    :param tackles: Raw tackles dataset
+    :param tracking: Raw tracking dataset
+    :return: Tuple of a dictionary with the valid rows of each dataset and the quarantine table, which has the name of
+    the dataset, the row index and the reasons of every quarantined row
+    """
+    tables = {'games': games, 'plays': plays, 'players': players, 'tackles': tackles, 'tracking': tracking}
+
+    valid_tables = {}
+    quarantines = []
+    for table_name, data in tables.items():
+        valid_tables[table_name], quarantine = validate_table(data, SCHEMAS[table_name], table_name)
+        quarantines.append(pd.DataFrame({'table': table_name, 'row': quarantine.index,
+                                         'reasons': quarantine['reasons'].to_numpy()}))
+
+    return valid_tables, pd.concat(quarantines, ignore_index=True)